@@ -5,6 +5,17 @@
 
 
 import os
+import sys
+import glob
+import json
+import time
+import uuid
+import pickle
+import hashlib
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -12,6 +23,247 @@ from dateutil import rrule
 from datetime import datetime, timedelta
 
 
+# In[3]:
+
+
+#parsed report cache - the excel file is parsed once per (path, mtime, size)
+#and kept as parquet in a .cache folder next to the report, plus a small
+#in-process LRU so repeat queries never touch openpyxl/xlrd
+
+CACHE_SIZE = 16
+_REPORT_CACHE = OrderedDict()
+
+
+def report_key(path, header_row):
+    '''
+    takes:
+    -path to the report
+    -row of the sheet that holds the header
+    returns:
+    -content address of the parsed report, changes when the file changes
+    '''
+    stat = os.stat(path)
+    key = '%s|%d|%d|%d' % (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, header_row)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+_ARROW_KINDS = ('string', 'empty', 'floating', 'integer', 'mixed-integer-float',
+                'datetime', 'datetime64', 'date', 'boolean')
+
+
+def _split_mixed(frame):
+    #parquet needs one type per column - mixed object columns (ex: amounts with
+    #a text subtotal row) are split into one column per python type
+    out = {}
+    for i in range(frame.shape[1]):
+        col = frame.iloc[:, i]
+        if col.dtype == object and pd.api.types.infer_dtype(col, skipna=True) not in _ARROW_KINDS:
+            kinds = col.map(lambda v: type(v).__name__)
+            for kind in kinds[col.notna()].unique():
+                out['%d:%s' % (i, kind)] = col.where(kinds == kind)
+        else:
+            out[str(i)] = col
+    return pd.DataFrame(out)
+
+
+def _join_mixed(frame, dtypes):
+    columns = []
+    for i, dtype in enumerate(dtypes):
+        parts = [c for c in frame.columns if c == str(i) or c.startswith('%d:' % i)]
+        col = pd.Series(np.nan, index=frame.index, dtype=object)
+        for part in parts:
+            col = col.where(frame[part].isna(), frame[part].astype(object))
+        columns.append(col.astype(dtype) if len(parts) == 1 else col)
+    return pd.concat(columns, axis=1, ignore_index=True)
+
+
+def _encode_header(header):
+    #[type tag, value] per cell so the cached header comes back with the same
+    #types as a fresh parse (np.int64(1) stays np.int64, not '1')
+    out = []
+    for h in header:
+        if not isinstance(h, str) and pd.isna(h):
+            out.append(['nan', None])
+        elif isinstance(h, np.generic):
+            out.append(['np:' + h.dtype.str, h.item()])
+        elif isinstance(h, (pd.Timestamp, datetime)):
+            out.append(['timestamp', pd.Timestamp(h).isoformat()])
+        elif isinstance(h, (bool, int, float, str)):
+            out.append([type(h).__name__, h])
+        else:
+            out.append(['str', str(h)])
+    return out
+
+
+def _decode_header(header):
+    out = []
+    for cell in header:
+        if not isinstance(cell, list): #written before the type tags
+            out.append(np.nan if cell is None else cell)
+            continue
+        tag, value = cell
+        if tag == 'nan':
+            out.append(np.nan)
+        elif tag.startswith('np:'):
+            out.append(np.dtype(tag[3:]).type(value))
+        elif tag == 'timestamp':
+            out.append(pd.Timestamp(value))
+        else:
+            out.append({'bool': bool, 'int': int, 'float': float}.get(tag, str)(value))
+    return out
+
+
+def _write_cache(frame, header, cache_path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    dtypes = [str(dtype) for dtype in frame.dtypes]
+    table = pa.Table.from_pandas(_split_mixed(frame), preserve_index=False)
+    meta = dict(table.schema.metadata or {})
+    meta[b'report_header'] = json.dumps(_encode_header(header)).encode('utf-8') #header may repeat names
+    meta[b'report_dtypes'] = json.dumps(dtypes).encode('utf-8')
+    table = table.replace_schema_metadata(meta)
+
+    tmp_path = cache_path + '.tmp'
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, cache_path) #never leave a half written cache file
+
+
+def _read_cache(cache_path):
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(cache_path)
+    header = _decode_header(json.loads(table.schema.metadata[b'report_header'].decode('utf-8')))
+    dtypes = json.loads(table.schema.metadata[b'report_dtypes'].decode('utf-8'))
+    frame = _join_mixed(table.to_pandas(integer_object_nulls=True), dtypes)
+    return frame, header
+
+
+def read_report(path, header_row=1, cache_dir=None):
+    '''
+    takes:
+    -path to the detailed cost / manhour report
+    -row holding the header (1 for the cost report, 0 for the manhour report)
+    -cache folder, defaults to .cache beside the report (git ignored), only the
+     newest parse of each report is kept
+    returns:
+    -report with the header applied and leading rows chopped off (nan kept)
+    '''
+    key = report_key(path, header_row)
+
+    if key in _REPORT_CACHE:
+        _REPORT_CACHE.move_to_end(key)
+        frame, header = _REPORT_CACHE[key]
+    else:
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), '.cache')
+        #<source>-<key>: the source part is the same for every version of this
+        #report, so older copies can be found and dropped
+        source = hashlib.sha1(('%s|%d' % (os.path.abspath(path), header_row)).encode('utf-8')).hexdigest()[:16]
+        cache_path = os.path.join(cache_dir, '%s-%s.parquet' % (source, key))
+
+        if os.path.exists(cache_path):
+            frame, header = _read_cache(cache_path)
+        else:
+            data = pd.read_excel(path)
+            new_index = data.reset_index()
+            header = list(new_index.iloc[header_row]) #identify a new header
+            frame = new_index[header_row + 1:].reset_index(drop=True) #chop off top rows
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                _write_cache(frame, header, cache_path)
+                for stale in glob.glob(os.path.join(cache_dir, source + '-*.parquet')):
+                    if stale != cache_path:
+                        os.remove(stale) #parse of an older version of the file
+            except (OSError, ImportError, ValueError, TypeError):
+                pass #disk cache is best effort, the LRU still applies
+
+        _REPORT_CACHE[key] = (frame, header)
+        if len(_REPORT_CACHE) > CACHE_SIZE:
+            _REPORT_CACHE.popitem(last=False)
+
+    frame = frame.copy() #callers rename and mutate columns in place
+    frame.columns = pd.Index(list(header), dtype=object)
+    return frame
+
+
+def clear_report_cache():
+    _REPORT_CACHE.clear()
+
+
+def window_sums(stamps, values, windows):
+    '''
+    takes:
+    -stamps sorted ascending (datetime64 array)
+    -values lined up with the stamps
+    -list of (start_date, end_date) windows
+    returns:
+    -sum of values with start_date < stamp <= end_date for every window
+    '''
+    starts = np.array([np.datetime64(pd.Timestamp(w[0]), 'ns') for w in windows])
+    ends = np.array([np.datetime64(pd.Timestamp(w[1]), 'ns') for w in windows])
+    cum = np.concatenate([[0.0], np.cumsum(values, dtype=float)])
+    return cum[np.searchsorted(stamps, ends, side='right')] - cum[np.searchsorted(stamps, starts, side='right')]
+
+
+# In[4]:
+
+
+#declared column types for the cleaned reports - keeps the amounts numeric and
+#the labels categorical so groupby/sum and date filters stay vectorized
+
+COST_SCHEMA = {'Stamp': 'datetime', 'Date': 'datetime',
+               'Amount': 'float', 'ST': 'float', 'OT': 'float', '2nd OT': 'float', 'Cost': 'float',
+               'Description': 'category', 'Extra': 'category', 'Craft': 'category',
+               'Foreman': 'category', 'Code': 'category'}
+
+
+def apply_schema(data, schema=None):
+    '''
+    takes:
+    -cleaned report (header applied, nan not yet filled)
+    -dict of column -> 'datetime' | 'float' | 'category', defaults to COST_SCHEMA
+    returns:
+    -(typed report, coercion failures: column, row and the value that did not fit)
+    '''
+    if schema is None:
+        schema = COST_SCHEMA
+    data = data.copy()
+    failures = []
+
+    for i, name in enumerate(data.columns): #by position, names repeat
+        kind = schema.get(name)
+        if kind is None:
+            continue
+        col = data.iloc[:, i]
+        if kind == 'category':
+            #blanks stay an explicit '' label, as with the old fillna(''), so
+            #groupby keeps their rows instead of dropping them as nan
+            typed = col.fillna('').astype('category')
+        else:
+            blank = col.isna() | (col.astype(str).str.strip() == '')
+            if kind == 'datetime':
+                typed = pd.to_datetime(col.where(~blank), errors='coerce')
+            else:
+                typed = pd.to_numeric(col.where(~blank), errors='coerce').astype('float64')
+            bad = typed.isna() & ~blank
+            failures.append(pd.DataFrame({'column': name, 'row': col.index[bad], 'value': col[bad].values}))
+        data.isetitem(i, typed)
+
+    if failures:
+        failures = pd.concat(failures, ignore_index=True)
+    else:
+        failures = pd.DataFrame(columns=['column', 'row', 'value'])
+
+    #blank whatever is left untyped, as before
+    for i, name in enumerate(data.columns):
+        if name in schema or not (pd.api.types.is_object_dtype(data.iloc[:, i])
+                                  or pd.api.types.is_string_dtype(data.iloc[:, i])):
+            continue
+        data.isetitem(i, data.iloc[:, i].fillna(''))
+    return data, failures
+
+
 # In[2]:
 
 
@@ -24,26 +276,37 @@ class DataLoad:
     1. input data as such: data = DataLoad('X-XX-XXX_mon.xls')
     2. to view the data: data.load_data().head()
     
+    The parsed report is cached (see read_report), so each method call
+    after the first reads parquet or memory instead of the excel file.
+    
     Burn rate
+    
+    Many windows at once: data.burn_windows([(start, end), ...]) returns the
+    burn of every labor group in LABOR_GROUPS for every window in one pass
+    
+    Against the incremental store: DataLoad('X-XX-XXX_mon.xls', store=CostStore('store'))
+    reads job X-XX-XXX from the store, every method works the same
     """
     
     
-    def __init__(self, file_name, labor_type=None, start_date=None, end_date=None, code=None):
+    def __init__(self, file_name, labor_type=None, start_date=None, end_date=None, code=None, store=None):
         self.data = file_name
         self.labor_type = labor_type
         self.start_date = start_date
         self.end_date = end_date
         self.code = code
+        self.store = store
+        self.coercion_failures = None
        
     def load_data(self):
+        if self.store is not None: #read the job from the CostStore instead of the spreadsheet
+            new_data_clean = self.store.load(report_tags(self.data)[0])
+            self.coercion_failures = pd.DataFrame(columns=['column', 'row', 'value'])
+            return new_data_clean
+        
         DATA_PATH = os.path.join(os.getcwd(),'data')
-        data = pd.read_excel(os.path.join(DATA_PATH, self.data))
-        new_index = data.reset_index()
-        new_header = new_index.iloc[1] #identify a new header
-        new_data = new_index[2:] #chop off top two rows
-        new_data_index = new_data.reset_index(drop=True) #reset again
-        new_data_clean = new_data_index.fillna('') #drop nan
-        new_data_clean.columns = new_header
+        new_data_index = read_report(os.path.join(DATA_PATH, self.data), header_row=1) #cached parse
+        new_data_clean, self.coercion_failures = apply_schema(new_data_index) #typed, see COST_SCHEMA
 
         return new_data_clean
     
@@ -68,6 +331,54 @@ class DataLoad:
         data = self.load_data()
         grouped = data.groupby('Extra')['Amount'].sum()
         return grouped
+    
+    def _stamped(self):
+        #craft, stamp and amount sorted by stamp once for the window queries
+        data = self.load_data()
+        stamped = pd.DataFrame({'craft': data['Description'].iloc[:,1].values,
+                                'stamp': pd.to_datetime(data['Stamp'], errors='coerce').values,
+                                'amount': pd.to_numeric(data['Amount'], errors='coerce').fillna(0).values})
+        stamped = stamped[stamped['stamp'].notna()]
+        return stamped.sort_values('stamp', kind='mergesort').reset_index(drop=True)
+    
+    def burn_windows(self, windows, labor_groups=None):
+        '''
+        takes:
+        -list of (start_date, end_date) windows
+        -dict of labor group name -> crafts, defaults to LABOR_GROUPS
+        returns:
+        -tidy frame, one row per window and labor group, same totals as
+         burn_rate().sum() for that window and labor_type
+        '''
+        if labor_groups is None:
+            labor_groups = LABOR_GROUPS
+        stamped = self._stamped()
+        wanted = set(craft for crafts in labor_groups.values() for craft in crafts)
+        
+        by_craft = {}
+        for craft, group in stamped[stamped['craft'].isin(wanted)].groupby('craft', sort=False):
+            by_craft[craft] = window_sums(group['stamp'].values, group['amount'].values, windows)
+        
+        empty = np.zeros(len(windows))
+        frames = []
+        for name, crafts in labor_groups.items():
+            frames.append(pd.DataFrame({'start_date': [w[0] for w in windows],
+                                        'end_date': [w[1] for w in windows],
+                                        'labor_group': name,
+                                        'amount': sum((by_craft.get(c, empty) for c in set(crafts)), empty)}))
+        return pd.concat(frames, ignore_index=True)
+    
+    def total_cost_windows(self, windows):
+        '''
+        takes:
+        -list of (start_date, end_date) windows
+        returns:
+        -frame with the total_cost of every window
+        '''
+        stamped = self._stamped()
+        return pd.DataFrame({'start_date': [w[0] for w in windows],
+                             'end_date': [w[1] for w in windows],
+                             'amount': window_sums(stamped['stamp'].values, stamped['amount'].values, windows)})
         
 
 
@@ -82,6 +393,13 @@ pipe_fit   = ['Pipeliner']
 just_labor = ['Carpenter Foreman', 'Carpenter', 'Dockbuilder', 'Timberman',                          'Labor Foreman', 'Laborer', 'Operator', 'Pipeliner']
 all_labor  = ['Carpenter Foreman', 'Carpenter', 'Dockbuilder', 'Timberman',                          'Labor Foreman', 'Laborer', 'Operator', 'Pipeliner',                             'Superintendent', 'Project Manager', 'Project Engineer',                                 'Field Engineer', 'Senior Project Manager', 'Sr Project Manager',                                     'Asst Project Manager', 'Project Analyst']
 
+LABOR_GROUPS = {'carpenters': carpenters,
+                'laborers': laborers,
+                'operators': operators,
+                'pipe_fit': pipe_fit,
+                'just_labor': just_labor,
+                'all_labor': all_labor}
+
 
 # In[17]:
 
@@ -95,21 +413,19 @@ class CostAnalyzer:
         self.end_date = end_date
         self.code = code
         self.overhead = overhead
+        self.coercion_failures = None
         
     def load_data_mob(self):
         DATA_PATH = os.path.join(os.getcwd(),'data')
-        data = pd.read_excel(os.path.join(DATA_PATH, self.data))
-        new_index = data.reset_index()
-        new_header = new_index.iloc[0]
-        new_data = new_index[1:]
-        new_data_index = new_data.reset_index(drop=True)
-        new_data_clean = new_data_index.fillna('')
-        new_data_clean.columns = new_header
-        new_data_clean.columns.values[5] = "Foreman"
-        new_data_clean.columns.values[2] = 'Name'
-        new_data_clean.columns.values[6] = 'ST'
-        new_data_clean.columns.values[3] = 'Date'
-        #new_data_clean.columns.values[4] = 'Craft'
+        new_data_index = read_report(os.path.join(DATA_PATH, self.data), header_row=0) #cached parse
+        columns = list(new_data_index.columns)
+        columns[5] = "Foreman"
+        columns[2] = 'Name'
+        columns[6] = 'ST'
+        columns[3] = 'Date'
+        #columns[4] = 'Craft'
+        new_data_index.columns = pd.Index(columns, dtype=object)
+        new_data_clean, self.coercion_failures = apply_schema(new_data_index) #typed, see COST_SCHEMA
         
         return new_data_clean
     
@@ -124,7 +440,9 @@ class CostAnalyzer:
         
         if self.overhead is None:
             overhead = int(input('How much overhead?'))
-            total_oh = int(overhead) * 50
+        else:
+            overhead = int(self.overhead)
+        total_oh = overhead * 50
             
         total   = total_oh + total
         man_cnt = overhead + man_cnt
@@ -134,6 +452,50 @@ class CostAnalyzer:
         
         return mh_rpt
     
+    def manhour_batch(self, overhead=None, data=None, freq='W'):
+        '''
+        takes:
+        -overhead head count per job, dict or Series (jobs left out get 0,
+         a single number applies to every job), 50 hours per head like manhour_rpt
+        -manhour data, defaults to this report (job code from its file name);
+         pass load_reports(..., kind='mob') output to cover every job at once
+        -period to bucket the Date column by, defaults to weekly
+        returns:
+        -ST/OT/2nd OT/Hours totals and headcount for every job and week, no prompts
+        '''
+        if data is None:
+            data = self.load_data_mob()
+        if overhead is None:
+            overhead = self.overhead if self.overhead is not None else 0
+        
+        #job code from the file name (report_tags) in both modes, so one
+        #overhead table keyed by job code works for a single report and for
+        #load_reports output
+        if 'job' in data.columns:
+            job = np.asarray(data['job'], dtype=object)
+        else:
+            job = np.full(len(data), report_tags(self.data)[0], dtype=object)
+        
+        hours = pd.DataFrame({'job': job,
+                              'week': pd.to_datetime(data['Date']).dt.to_period(freq).dt.end_time.dt.normalize(),
+                              'Name': np.asarray(data['Name'], dtype=object),
+                              'ST': data['ST'].values, 'OT': data['OT'].values, '2nd OT': data['2nd OT'].values})
+        
+        mh_rpt = hours.groupby(['job', 'week'], observed=True).agg(ST=('ST', 'sum'), OT=('OT', 'sum'),
+                                                                    OT2=('2nd OT', 'sum'),
+                                                                    count=('Name', 'nunique'))
+        mh_rpt = mh_rpt.rename(columns={'OT2': '2nd OT'}).reset_index()
+        
+        if np.isscalar(overhead):
+            oh = pd.Series(int(overhead), index=mh_rpt.index)
+        else:
+            oh = mh_rpt['job'].map(pd.Series(overhead, dtype=float)).fillna(0).astype(int)
+        mh_rpt['overhead'] = oh.values
+        mh_rpt['Hours'] = mh_rpt['ST'] + mh_rpt['OT'] + mh_rpt['2nd OT'] + mh_rpt['overhead'] * 50
+        mh_rpt['count'] = mh_rpt['count'] + mh_rpt['overhead']
+        
+        return mh_rpt[['job', 'week', 'ST', 'OT', '2nd OT', 'overhead', 'Hours', 'count']]
+    
     def burn_rpt(self, st=None, ot=None, craft_cost=None, total=None):
         data   = self.load_data_mob()
         data.columns = ['#','Code', 'Name', 'Date', 'Craft', 'Foreman', 'ST', 'OT', '2nd OT', 'Cost']
@@ -149,6 +511,245 @@ class CostAnalyzer:
     
 
 
+# In[22]:
+
+
+#roll up many jobs/months: one X-XX-XXX_mon.xls per job per month
+
+def report_tags(path):
+    '''
+    takes: path like .../X-XX-XXX_mon.xls
+    returns: (job code, report month)
+    '''
+    stem = os.path.splitext(os.path.basename(path))[0]
+    job, _, month = stem.rpartition('_')
+    return (job, month) if job else (stem, '')
+
+
+def _parse_report(path, kind):
+    #runs in a worker process - excel parsing holds the GIL
+    start = time.perf_counter()
+    path = os.path.abspath(path) #os.path.join keeps absolute paths as is
+    if kind == 'mob':
+        loader = CostAnalyzer(path)
+        data = loader.load_data_mob()
+    else:
+        loader = DataLoad(path)
+        data = loader.load_data()
+    return data, len(loader.coercion_failures), time.perf_counter() - start
+
+
+def _workers_can_import():
+    #spawned workers (macOS/Windows default) re-import the module that defines
+    #_parse_report; a notebook kernel's __main__ has no file to import from
+    if multiprocessing.get_start_method() == 'fork':
+        return True
+    return getattr(sys.modules.get(_parse_report.__module__), '__file__', None) is not None
+
+
+def _parsed(paths, kind, processes, verbose):
+    #(path, (data, n_failures, seconds) or the exception) as each file finishes
+    if processes == 1:
+        for path in paths:
+            try:
+                yield path, _parse_report(path, kind)
+            except Exception as e:
+                yield path, e
+        return
+
+    retry = []
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = {pool.submit(_parse_report, path, kind): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except (BrokenProcessPool, pickle.PicklingError) as e: #the pool failed, not the file
+                retry.append((futures[future], e))
+            except Exception as e:
+                yield futures[future], e
+    if retry:
+        if verbose:
+            print('load_reports: worker pool failed (%r) - parsing %d files in this process'
+                  % (retry[0][1], len(retry)))
+        yield from _parsed([path for path, _ in retry], kind, 1, verbose)
+
+
+def report_layout(columns):
+    '''
+    header as comparable strings - blank cells are nan and nan != nan, so two
+    identical reports would otherwise never match
+    '''
+    return tuple('' if pd.isna(h) else str(h) for h in columns)
+
+
+def load_reports(pattern, kind='cost', processes=None, verbose=True):
+    '''
+    takes:
+    -glob pattern or a directory of reports ex: 'data/*_*.xls'
+    -kind of report, 'cost' (DataLoad.load_data) or 'mob' (CostAnalyzer.load_data_mob)
+    -number of worker processes, defaults to the cpu count; 1 parses in this
+     process, which is also the fallback when the workers cannot import the
+     parser (spawn start method from a notebook)
+    returns:
+    -(all reports in one typed frame (COST_SCHEMA) tagged with job and month,
+      per file timing report)
+    '''
+    if os.path.isdir(pattern):
+        paths = sorted(glob.glob(os.path.join(pattern, '*.xls')) + glob.glob(os.path.join(pattern, '*.xlsx')))
+    else:
+        paths = sorted(glob.glob(pattern))
+
+    frames = {}
+    timings = []
+    timing_of = {}
+    if processes != 1 and not _workers_can_import():
+        print('load_reports: worker processes cannot import _parse_report (%s start method, no module '
+              'file) - parsing in this process instead' % multiprocessing.get_start_method())
+        processes = 1
+    for n, (path, result) in enumerate(_parsed(paths, kind, processes, verbose), 1):
+        job, month = report_tags(path)
+        if isinstance(result, Exception): #one bad spreadsheet should not sink the roll up
+            data, n_failures, seconds, error = None, 0, np.nan, repr(result)
+        else:
+            data, n_failures, seconds = result
+            error = ''
+            frames[path] = data.assign(job=job, month=month)
+        timings.append({'file': os.path.basename(path), 'job': job, 'month': month,
+                        'rows': 0 if data is None else len(data), 'seconds': seconds,
+                        'coercion_failures': n_failures, 'error': error})
+        timing_of[path] = timings[-1]
+        if verbose:
+            print('[%d/%d] %s: %s rows in %.2fs %s' % (n, len(paths), os.path.basename(path),
+                                                      timings[-1]['rows'], seconds, error))
+
+    #headers repeat names (two Description columns) so stack by position; a file
+    #laid out differently from the majority is reported and left out, not raised
+    if frames:
+        layouts = {path: report_layout(frames[path].columns) for path in paths if path in frames}
+        reference = pd.Series(list(layouts.values())).value_counts(sort=True).index[0]
+        header = list(frames[next(p for p in layouts if layouts[p] == reference)].columns)
+        for path in layouts:
+            if layouts[path] != reference:
+                timing_of[path]['error'] = 'report layout differs: %s' % list(frames.pop(path).columns)
+                if verbose:
+                    print('%s: %s' % (os.path.basename(path), timing_of[path]['error']))
+
+    timing_rpt = pd.DataFrame(timings, columns=['file', 'job', 'month', 'rows', 'seconds',
+                                                'coercion_failures', 'error'])
+    timing_rpt = timing_rpt.sort_values('seconds', ascending=False).reset_index(drop=True)
+
+    if not frames:
+        return pd.DataFrame(), timing_rpt
+
+    frames = [frames[path] for path in paths if path in frames]
+    data = pd.concat([frame.set_axis(range(len(header)), axis=1) for frame in frames], ignore_index=True)
+    data.columns = pd.Index(header, dtype=object)
+    #categories differ per file so concat falls back to object - re-apply the schema
+    schema = dict(COST_SCHEMA, job='category', month='category')
+    data, _ = apply_schema(data, schema)
+    return data, timing_rpt
+
+
+# In[23]:
+
+
+class CostStore:
+    
+    """
+    Append-only local store of cleaned cost report rows, partitioned by job and month
+    
+    1. store = CostStore('store')
+    2. each month: store.ingest('data/X-XX-XXX_mon.xls') - only rows not already in
+       the store are written (rows are keyed by a hash of their content)
+    3. store.load('X-XX-XXX') or DataLoad('X-XX-XXX_mon.xls', store=store)
+    
+    Part files are never rewritten. Each ingest also records which row hashes the
+    newest report holds (live.parquet), so changed or dropped rows fall out of load()
+    """
+    
+    HASH = '_row_hash'
+    
+    def __init__(self, root):
+        self.root = root
+    
+    def _job_dir(self, job):
+        return os.path.join(self.root, 'job=%s' % job)
+    
+    def _parts(self, job):
+        return sorted(glob.glob(os.path.join(self._job_dir(job), 'month=*', 'part-*.parquet')))
+    
+    @staticmethod
+    def row_hashes(data):
+        #content hash, numbered so identical rows in one report stay distinct;
+        #column 0 is the row position from read_report's reset_index, left out
+        #so a row keeps its hash when rows are inserted above it
+        h = pd.Series(pd.util.hash_pandas_object(data.iloc[:, 1:], index=False).values)
+        n = h.groupby(h).cumcount()
+        return pd.util.hash_pandas_object(pd.DataFrame({'h': h, 'n': n}), index=False).values
+    
+    def _stored_hashes(self, job):
+        import pyarrow.parquet as pq
+        
+        hashes = []
+        for part in self._parts(job):
+            header = _decode_header(json.loads(pq.read_schema(part).metadata[b'report_header'].decode('utf-8')))
+            column = str(header.index(self.HASH))
+            hashes.append(pq.read_table(part, columns=[column]).column(0).to_numpy())
+        return np.concatenate(hashes) if hashes else np.array([], dtype='uint64')
+    
+    def ingest(self, path):
+        '''
+        takes: path to a newly dropped detailed cost report
+        returns: dict with the job, rows in the report, rows written and rows already stored
+        '''
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        job, _ = report_tags(path)
+        data = DataLoad(os.path.abspath(path)).load_data()
+        hashes = self.row_hashes(data)
+        new = ~np.isin(hashes, self._stored_hashes(job))
+        
+        delta = data[new].copy()
+        delta[self.HASH] = hashes[new]
+        stamp = pd.to_datetime(delta['Stamp'], errors='coerce')
+        months = stamp.dt.strftime('%Y-%m').fillna('none')
+        
+        written = time.strftime('%Y%m%dT%H%M%S') + '-' + uuid.uuid4().hex[:8] #never overwrite a part
+        for month, rows in delta.groupby(months.values, sort=True):
+            month_dir = os.path.join(self._job_dir(job), 'month=%s' % month)
+            os.makedirs(month_dir, exist_ok=True)
+            _write_cache(rows, list(rows.columns), os.path.join(month_dir, 'part-%s.parquet' % written))
+        
+        os.makedirs(self._job_dir(job), exist_ok=True)
+        live = os.path.join(self._job_dir(job), 'live.parquet')
+        pq.write_table(pa.table({self.HASH: hashes}), live + '.tmp')
+        os.replace(live + '.tmp', live)
+        
+        return {'job': job, 'rows': len(data), 'written': int(new.sum()), 'stored': int((~new).sum())}
+    
+    def load(self, job):
+        '''
+        takes: job code
+        returns: the rows of the newest ingested report for that job, typed like load_data
+        '''
+        import pyarrow.parquet as pq
+        
+        live = pq.read_table(os.path.join(self._job_dir(job), 'live.parquet')).column(0).to_numpy()
+        frames = []
+        header = None
+        for part in self._parts(job):
+            frame, header = _read_cache(part)
+            frames.append(frame) #positional columns, the header repeats names
+        
+        data = pd.concat(frames, ignore_index=True)
+        hash_at = header.index(self.HASH)
+        data = data[np.isin(data.iloc[:, hash_at].values.astype('uint64'), live)]
+        data = data.drop(columns=data.columns[hash_at]).reset_index(drop=True)
+        data.columns = pd.Index([h for i, h in enumerate(header) if i != hash_at], dtype=object)
+        return apply_schema(data)[0]
+
+
 # In[ ]:
 
 
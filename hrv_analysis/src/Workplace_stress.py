@@ -48,6 +48,8 @@ import networkx as nx
 from scipy.stats import mannwhitneyu
 from scipy.stats import wilcoxon
 import matplotlib.patches as mpatches
+from src.hrv import load_workbook, condition_stats, stat_table
+from src.compare import compare_conditions
 get_ipython().run_line_magic('matplotlib', 'inline')
 
 
@@ -65,24 +67,10 @@ files
 # In[100]:
 
 
-data = pd.ExcelFile(files[0]); data
+#the data is in sheets - load_workbook reads them all in one pass and caches
+#the combined frame as parquet in data/.cache, so re-runs skip excel
 
-
-# In[101]:
-
-
-#the data is in sheets - unpack all the sheets and append them in a for loop
-
-#data_df = pd.DataFrame()
-
-for sheet in data.sheet_names:
-    if sheet == 'p1':
-        data_df = pd.read_excel(files[0], sheet_name=sheet)
-        print('sheet: ' + str(sheet))
-    else:
-        df = pd.read_excel(files[0], sheet_name=sheet)
-        print('sheet: ' + str(sheet))
-        data_df = data_df.append(df, ignore_index=True) 
+data_df = load_workbook(files[0])
 
 
 # In[102]:
@@ -200,23 +188,16 @@ plt.show()
 #collect study means
 #by particpant/hue=condition, y axis = rMSSD
 
-SUBJECTS = data.sheet_names
+SUBJECTS = list(data_df.subject.cat.categories)
 CONDITIONS = data_df.Condition.unique()
 
-def calculate_mean_rmssd(condition,subject):
-    return data_df[(data_df.Condition==condition) & (data_df.subject==subject)].RMSSD.mean()
+#mean/median/std/count of RMSSD and HR per (subject, condition) in one groupby,
+#reused by the plots below
+hrv_stats = condition_stats(data_df)
 
-#def calculate_mean_hr(condition,subject):
-    #return data_df[(data_df.Condition==condition) & (data_df.subject==subject)].HR.mean()
-
-def generate_means(conditions,subjects):
-    output={}
-    
-    for subject in subjects:
-        m = tuple(calculate_mean_rmssd(condition,subject) for condition in conditions)
-        output[subject] = m
-    
-    return output
+def generate_means(conditions,subjects,metric='RMSSD'):
+    table = stat_table(hrv_stats, metric).reindex(index=subjects, columns=conditions)
+    return {subject: tuple(m) for subject, m in zip(table.index, table.to_numpy())}
 
 def generate_scatter(value,value_range):
     [plt.scatter(SUBJECTS, [elem[i] for elem in value.values()]) for i in range(value_range)]
@@ -270,11 +251,12 @@ rows = 5
 columns = 5
 
 temp_list = [0,5,10,15,20]
+by_subject = dict(list(data_df.groupby('subject', observed=True))) #split once, not a mask per plot
 
 for x in range(rows):
     for y in range(columns):
         value = temp_list[x] + y
-        DATA=data_df[data_df['subject']==list(rmssd_means.keys())[value]]
+        DATA=by_subject[list(rmssd_means.keys())[value]]
         sns.boxplot(x='Condition',y='RMSSD',data=DATA,ax=axs[x,y])
 
 axs[0][2].set_title('RMSSD Ranges By Subject')
@@ -288,105 +270,35 @@ plt.show()
 # In[36]:
 
 
-rest_rmssd_all = data_df[data_df['Condition']=='R'].RMSSD
-neutral_rmssd_all = data_df[data_df['Condition']=='N'].RMSSD
-time_rmssd_all = data_df[data_df['Condition']=='T'].RMSSD
-interrupt_rmssd_all = data_df[data_df['Condition']=='I'].RMSSD
+#every condition pair, raw and log transformed, t-test / mann-whitney / paired
+#wilcoxon on subject means, holm corrected across all of them
+results = compare_conditions(data_df, metrics=('RMSSD',), transforms=('raw', 'log'))
+results
 
 
 # In[74]:
 
 
-#compare rest v. neutral
-stat, p = ttest_ind(rest_rmssd_all.dropna(), neutral_rmssd_all.dropna())
-print('Statistics=%.3f, p=%.3f' % (stat, p))
-
+#compare rest v. neutral / time / interruption
 alpha = 0.05
-if p > alpha:
-    print('Same distribution (fail to reject H0)')
-    print(rest_rmssd_all.dropna().mean())
-else:
-    print('Different distribution (reject H0)')
-
-
-# In[63]:
-
-
-#compare rest v. time
-stat, p = ttest_ind(rest_rmssd_all.dropna(), time_rmssd_all.dropna())
-print('Statistics=%.3f, p=%.3f' % (stat, p))
-
-alpha = 0.05
-if p > alpha:
-    print('Same distribution (fail to reject H0)')
-else:
-    print('Different distribution (reject H0)')
-
-
-# In[64]:
-
-
-#compare rest v. time
-stat, p = ttest_ind(rest_rmssd_all.dropna(), interrupt_rmssd_all.dropna())
-print('Statistics=%.3f, p=%.3f' % (stat, p))
-
-alpha = 0.05
-if p > alpha:
-    print('Same distribution (fail to reject H0)')
-else:
-    print('Different distribution (reject H0)')
+for row in results[(results.a == 'R') & (results.test == 'ttest')].itertuples():
+    print('%s rest v. %s: Statistics=%.3f, p=%.3f' % (row.transform, row.b, row.statistic, row.p))
+    if row.p > alpha:
+        print('Same distribution (fail to reject H0)')
+    else:
+        print('Different distribution (reject H0)')
 
 
 # ## Log Transformation
 # 
-
-# In[75]:
-
-
-rest_rmssd_log = rest_rmssd_all.apply(np.log)
-neutral_rmssd_log = neutral_rmssd_all.apply(np.log)
-time_rmssd_log = time_rmssd_all.apply(np.log)
-interrupt_rmssd_log = interrupt_rmssd_all.apply(np.log)
-
+# The log transformed rows above pull in the right skew; a permutation test on
+# the difference in means gives p values that do not assume normality at all.
 
 # In[81]:
 
 
-#compare rest v. neutral
-stat, p = ttest_ind(rest_rmssd_log.dropna(), neutral_rmssd_log.dropna())
-print('Statistics=%.3f, p=%.3f' % (stat, p))
-
-alpha = 0.05
-if p > alpha:
-    print('Same distribution (fail to reject H0)')
-else:
-    print('Different distribution (reject H0)')
-
-
-# In[78]:
-
-
-stat, p = ttest_ind(rest_rmssd_log.dropna(), time_rmssd_log.dropna())
-print('Statistics=%.3f, p=%.3f' % (stat, p))
-
-alpha = 0.05
-if p > alpha:
-    print('Same distribution (fail to reject H0)')
-else:
-    print('Different distribution (reject H0)')
-
-
-# In[80]:
-
-
-stat, p = ttest_ind(rest_rmssd_log.dropna(), interrupt_rmssd_log.dropna())
-print('Statistics=%.3f, p=%.3f' % (stat, p))
-
-alpha = 0.05
-if p > alpha:
-    print('Same distribution (fail to reject H0)')
-else:
-    print('Different distribution (reject H0)')
+permuted = compare_conditions(data_df, transforms=('log',), resample='permutation', n_resamples=10000)
+permuted[['a', 'b', 'test', 'p', 'p_adj', 'p_mean_diff_resampled', 'p_mean_diff_resampled_adj']]
 
 
 # ## Research Proposal
@@ -0,0 +1,191 @@
+from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.stats import ttest_ind, mannwhitneyu, wilcoxon
+
+TRANSFORMS = {'raw': None, 'log': np.log}
+TESTS = ('ttest', 'mannwhitney', 'wilcoxon')
+PAIRED = ('wilcoxon',) #run on per-subject means, subjects seen in both conditions
+CHUNK = 2500 #resamples per pool task
+
+
+def _samples(data_df, metric, transform, by):
+    #transformed metric per condition, plus per-subject means for the paired tests
+    values = data_df[metric] if transform is None else transform(data_df[metric])
+    frame = pd.DataFrame({'Condition': data_df['Condition'], by: data_df[by], 'value': values}).dropna()
+    pooled = {c: g['value'].to_numpy() for c, g in frame.groupby('Condition')}
+    means = frame.groupby([by, 'Condition'], observed=True)['value'].mean().unstack('Condition')
+    return pooled, means
+
+
+def _run(test, a, b):
+    if test == 'ttest':
+        return ttest_ind(a, b)
+    if test == 'mannwhitney':
+        return mannwhitneyu(a, b, alternative='two-sided')
+    if test == 'wilcoxon':
+        return wilcoxon(a, b)
+    raise ValueError('unknown test %r, expected one of %s' % (test, TESTS))
+
+
+def adjust(p, method='holm'):
+    '''
+    takes:
+    -p values of one family of tests (nan ignored)
+    -'holm', 'bonferroni', 'fdr_bh' or None
+    returns:
+    -adjusted p values, same order
+    '''
+    p = np.asarray(p, dtype=float)
+    out = np.full(p.shape, np.nan)
+    ok = ~np.isnan(p)
+    q = p[ok]
+    m = len(q)
+    if method is None or m == 0:
+        out[ok] = q
+        return out
+
+    order = np.argsort(q)
+    ranked = q[order]
+    if method == 'bonferroni':
+        adj = ranked * m
+    elif method == 'holm':
+        adj = np.maximum.accumulate(ranked * (m - np.arange(m)))
+    elif method == 'fdr_bh':
+        adj = np.minimum.accumulate((ranked * m / np.arange(1, m + 1))[::-1])[::-1]
+    else:
+        raise ValueError("method must be 'holm', 'bonferroni', 'fdr_bh' or None, got %r" % method)
+
+    q = np.empty(m)
+    q[order] = np.minimum(adj, 1.0)
+    out[ok] = q
+    return out
+
+
+def _null_count(paired, method, a, b, n, seed, batch=1000):
+    '''
+    resampled |mean difference| at least as large as the observed one, n draws
+    done batch at a time as matrix ops
+
+    paired: a - b per subject, sign flips (permutation) or the centred
+    differences resampled (bootstrap); unpaired: group labels shuffled
+    (permutation) or both groups centred on the pooled mean and resampled
+    (bootstrap)
+    '''
+    rng = np.random.default_rng(seed)
+    hits = 0
+    if paired:
+        d = a - b
+        observed = abs(d.mean())
+        centred = d - d.mean()
+        for size in np.diff(np.r_[0:n:batch, n]):
+            if method == 'permutation':
+                null = (rng.choice([-1.0, 1.0], size=(size, len(d))) @ d) / len(d)
+            else:
+                null = centred[rng.integers(0, len(d), size=(size, len(d)))].mean(axis=1)
+            hits += int((np.abs(null) >= observed - 1e-12).sum())
+        return hits
+
+    observed = abs(a.mean() - b.mean())
+    pooled = np.concatenate([a, b])
+    if method == 'bootstrap':
+        a = a - a.mean() + pooled.mean()
+        b = b - b.mean() + pooled.mean()
+    for size in np.diff(np.r_[0:n:batch, n]):
+        if method == 'permutation':
+            #a random len(a) subset per row (smallest random keys) is group a, the rest b
+            idx = rng.random((size, len(pooled))).argpartition(len(a) - 1, axis=1)[:, :len(a)]
+            sum_a = pooled[idx].sum(axis=1)
+            mean_a = sum_a / len(a)
+            mean_b = (pooled.sum() - sum_a) / len(b)
+        else:
+            mean_a = a[rng.integers(0, len(a), size=(size, len(a)))].mean(axis=1)
+            mean_b = b[rng.integers(0, len(b), size=(size, len(b)))].mean(axis=1)
+        hits += int((np.abs(mean_a - mean_b) >= observed - 1e-12).sum())
+    return hits
+
+
+def compare_conditions(data_df, metrics=('RMSSD',), pairs=None, transforms=('raw', 'log'), tests=TESTS,
+                       correction='holm', alpha=0.05, resample=None, n_resamples=10000, processes=None,
+                       seed=0, by='subject'):
+    '''
+    takes:
+        data_df --> frame from load_workbook
+        metrics --> metric columns to test
+        pairs --> (condition, condition) tuples, every pair of conditions if None
+        transforms --> names from TRANSFORMS applied before testing
+        tests --> any of 'ttest', 'mannwhitney' (all samples per condition) and
+                  'wilcoxon' (paired, per-subject means)
+        correction --> 'holm', 'bonferroni', 'fdr_bh' or None, over every row
+        resample --> None, 'permutation' or 'bootstrap' for an extra p value on
+                     the difference in means of each row's samples; it tests the
+                     means whichever test the row names, so the ttest and
+                     mannwhitney rows of a pair carry the same value
+        n_resamples --> draws per row, split across the process pool
+        processes --> workers for the resampling, None for all cpus, 1 inline
+        seed --> makes the resampled p values reproducible
+    returns:
+        one row per (metric, transform, pair, test) with sample sizes, statistic,
+        p, p_adj and reject (plus p_mean_diff_resampled and its _adj)
+    '''
+    rows = []
+    draws = []
+    keys = {}
+    row_draw = []
+    for metric in metrics:
+        for name in transforms:
+            pooled, means = _samples(data_df, metric, TRANSFORMS[name], by)
+            conditions = list(data_df['Condition'].dropna().unique())
+            for c1, c2 in (pairs if pairs is not None else combinations(conditions, 2)):
+                for test in tests:
+                    if test in PAIRED:
+                        both = means.reindex(columns=[c1, c2]).dropna()
+                        a, b = both[c1].to_numpy(), both[c2].to_numpy()
+                    else:
+                        a, b = pooled.get(c1, np.empty(0)), pooled.get(c2, np.empty(0))
+                    stat, p = _run(test, a, b) if len(a) > 1 and len(b) > 1 else (np.nan, np.nan)
+                    rows.append({'metric': metric, 'transform': name, 'a': c1, 'b': c2, 'test': test,
+                                 'n_a': len(a), 'n_b': len(b), 'mean_a': a.mean() if len(a) else np.nan,
+                                 'mean_b': b.mean() if len(b) else np.nan, 'statistic': stat, 'p': p})
+                    #rows on the same samples (ttest, mannwhitney) share one resampled null
+                    key = (metric, name, c1, c2, test in PAIRED)
+                    if key not in keys:
+                        keys[key] = len(draws)
+                        draws.append((test in PAIRED, a, b))
+                    row_draw.append(keys[key])
+
+    df = pd.DataFrame(rows)
+    df['p_adj'] = adjust(df['p'], correction)
+    df['reject'] = df['p_adj'] < alpha
+    if resample is None:
+        return df
+    if resample not in ('permutation', 'bootstrap'):
+        raise ValueError("resample must be 'permutation', 'bootstrap' or None, got %r" % resample)
+
+    #each row's draws are cut into fixed chunks, every chunk with its own seed
+    #stream, so the p values do not depend on the number of workers
+    sizes = np.diff(np.r_[0:n_resamples:CHUNK, n_resamples])
+    chunks = len(sizes)
+    seeds = np.random.SeedSequence(seed).spawn(len(draws) * chunks)
+    tasks = [(i, (paired, resample, a, b, int(size), seeds[i * chunks + j]))
+             for i, (paired, a, b) in enumerate(draws) if len(a) > 1 and len(b) > 1
+             for j, size in enumerate(sizes) if size]
+
+    hits = np.zeros(len(draws))
+    if processes == 1:
+        for i, args in tasks:
+            hits[i] += _null_count(*args)
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [(i, pool.submit(_null_count, *args)) for i, args in tasks]
+            for i, future in futures:
+                hits[i] += future.result()
+
+    done = np.array([len(a) > 1 and len(b) > 1 for paired, a, b in draws])
+    p_resampled = np.where(done, (hits + 1) / (n_resamples + 1), np.nan)
+    df['p_mean_diff_resampled'] = p_resampled[row_draw]
+    #one resampled test per distinct sample pair, so that is the family size
+    df['p_mean_diff_resampled_adj'] = adjust(p_resampled, correction)[row_draw]
+    return df
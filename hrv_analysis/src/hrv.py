@@ -0,0 +1,81 @@
+import os
+import glob
+import hashlib
+
+import pandas as pd
+
+
+def workbook_key(path):
+    '''
+    takes:
+    -path to the workbook
+    returns:
+    -content address of the parsed workbook, changes when the file changes
+    '''
+    stat = os.stat(path)
+    key = '%s|%d|%d' % (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def load_workbook(path, cache_dir=None):
+    '''
+    takes:
+    -path to the workbook with one sheet per subject (hrv stress labels.xlsx)
+    -cache folder, defaults to .cache beside the workbook (git ignored), only
+     the newest parse is kept
+    returns:
+    -every sheet in one frame, subject as a categorical ordered like the sheets
+    '''
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), '.cache')
+    #<source>-<key>: the source part is the same for every version of this
+    #workbook, so older copies can be found and dropped
+    source = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:16]
+    cache_path = os.path.join(cache_dir, '%s-%s.parquet' % (source, workbook_key(path)))
+
+    if os.path.exists(cache_path):
+        return pd.read_parquet(cache_path)
+
+    sheets = pd.read_excel(path, sheet_name=None) #one open, every sheet
+    data_df = pd.concat(sheets.values(), ignore_index=True)
+    data_df['subject'] = pd.Categorical(data_df['subject'], categories=list(sheets))
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        data_df.to_parquet(cache_path)
+        for stale in glob.glob(os.path.join(cache_dir, source + '-*.parquet')):
+            if stale != cache_path:
+                os.remove(stale) #parse of an older version of the workbook
+    except (OSError, ImportError, ValueError, TypeError):
+        pass #disk cache is best effort, the excel parse still applies
+    return data_df
+
+
+METRICS = ('RMSSD', 'HR')
+STATS = ('mean', 'median', 'std', 'count')
+
+
+def condition_stats(data_df, metrics=METRICS, stats=STATS, by=('subject', 'Condition')):
+    '''
+    takes:
+    -frame from load_workbook
+    -metric columns to summarise, ex: ('RMSSD', 'HR', 'SCL')
+    -statistics per metric
+    -grouping columns
+    returns:
+    -tidy frame, one row per (subject, Condition, metric) with a column per
+     statistic, from a single groupby pass (nan values are skipped, count is
+     the number of non-nan samples)
+    '''
+    grouped = data_df.groupby(list(by), observed=True, sort=True)[list(metrics)].agg(list(stats))
+    tidy = grouped.stack(level=0)
+    tidy.index = tidy.index.set_names(list(by) + ['metric'])
+    return tidy[list(stats)].reset_index()
+
+
+def stat_table(tidy, metric='RMSSD', stat='mean', index='subject', columns='Condition'):
+    '''
+    one statistic of one metric from condition_stats as a wide table,
+    ex: mean RMSSD with a row per subject and a column per condition
+    '''
+    return tidy[tidy['metric'] == metric].pivot(index=index, columns=columns, values=stat)
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+
+RARE_TITLES = ['Lady', 'Countess', 'Capt', 'Col', 'Don', 'Dr', 'Major', 'Rev', 'Sir', 'Jonkheer', 'Dona']
+TITLE_MAPPING = {"Mr": 1, "Miss": 2, "Mrs": 3, "Master": 4, "Rare": 5}
+TITLE_REPLACE = dict({t: 'Rare' for t in RARE_TITLES}, Mlle='Miss', Ms='Miss', Mme='Mrs')
+EMBARKED_MAPPING = {'S': 0, 'C': 1, 'Q': 2}
+
+FEATURES = ['Pclass', 'Sex', 'Age', 'Fare', 'Embarked', 'Title', 'IsAlone', 'Age*Class']
+
+
+class TitanicFeatures:
+
+    """
+    The w_random_5.py preprocessing as a fitted transformer
+
+    1. features = TitanicFeatures().fit(train_df)
+    2. X = features.transform(any_df) - train, test or a scoring batch
+
+    fit learns everything that depends on the data (age medians by Sex/Pclass,
+    the embarked mode, the fare median and the age/fare band edges) from the
+    training frame only; transform is a single vectorized pass with no row loops
+    """
+
+    def __init__(self, age_bands=5, fare_bands=4):
+        self.age_bands = age_bands
+        self.fare_bands = fare_bands
+
+    @staticmethod
+    def titles(name):
+        title = name.str.extract(r' ([A-Za-z]+)\.', expand=False).replace(TITLE_REPLACE)
+        return title.map(TITLE_MAPPING).fillna(0)
+
+    def _impute_age(self, df, sex):
+        key = pd.MultiIndex.from_arrays([sex, df['Pclass']])
+        guess = self.age_medians_.reindex(key).values
+        return df['Age'].fillna(pd.Series(guess, index=df.index))
+
+    def fit(self, df):
+        sex = df['Sex'].map({'female': 1, 'male': 0})
+
+        #median age per (Sex, Pclass), rounded to the nearest .5 like guess_ages
+        medians = df.groupby([sex, df['Pclass']])['Age'].median()
+        self.age_medians_ = (medians / 0.5 + 0.5).astype(int) * 0.5
+
+        age = self._impute_age(df, sex).astype(int)
+        _, age_edges = pd.cut(age, self.age_bands, retbins=True)
+        _, fare_edges = pd.qcut(df['Fare'].dropna(), self.fare_bands, retbins=True)
+        self.age_edges_ = age_edges[1:-1]
+        self.fare_edges_ = fare_edges[1:-1]
+
+        self.freq_port_ = df['Embarked'].dropna().mode()[0]
+        self.fare_median_ = df['Fare'].dropna().median()
+        return self
+
+    def transform(self, df):
+        '''
+        takes: raw titanic frame (train/test columns, Survived optional)
+        returns: FEATURES frame, same index as df
+        '''
+        sex = df['Sex'].map({'female': 1, 'male': 0}).astype(int)
+        age = self._impute_age(df, sex).astype(int)
+        fare = df['Fare'].fillna(self.fare_median_)
+
+        out = pd.DataFrame(index=df.index)
+        out['Pclass'] = df['Pclass']
+        out['Sex'] = sex
+        out['Age'] = pd.cut(age, np.r_[-np.inf, self.age_edges_, np.inf], labels=False).astype(int)
+        out['Fare'] = pd.cut(fare, np.r_[-np.inf, self.fare_edges_, np.inf], labels=False).astype(int)
+        out['Embarked'] = df['Embarked'].fillna(self.freq_port_).map(EMBARKED_MAPPING).astype(int)
+        out['Title'] = self.titles(df['Name'])
+        out['IsAlone'] = (df['SibSp'] + df['Parch'] + 1 == 1).astype(int)
+        out['Age*Class'] = out['Age'] * out['Pclass']
+        return out[FEATURES]
+
+    def fit_transform(self, df):
+        return self.fit(df).transform(df)
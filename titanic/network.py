@@ -0,0 +1,126 @@
+import numpy as np
+
+
+def relu(x):
+    return (x>0) * x
+
+def relu2deriv(output):
+    return output>0
+
+
+def init_weights(n_inputs, hidden_size, seed=1):
+    '''
+    same draws as np.random.seed(seed) followed by the two np.random.random calls
+    '''
+    rng = np.random.RandomState(seed)
+    weights_0_1 = 2*rng.random_sample((n_inputs,hidden_size)) - 1
+    weights_1_2 = 2*rng.random_sample((hidden_size,1)) - 1
+    return weights_0_1, weights_1_2
+
+
+def train(ip, gp, alpha=.0006, hidden_size=8, iterations=10000, batch_size=32,
+          tol=None, patience=10, seed=1, verbose=False):
+    '''
+    two layer relu network trained with matrix ops over mini-batches
+
+    takes:
+    -ip: input features, one row per passenger
+    -gp: targets (0/1)
+    -alpha: learning rate on the mean gradient of a batch, so one alpha gives the
+     same step size at any batch_size (batch_size=1 is the original row by row
+     loop; a batch used to take the sum of its rows' updates, which at full batch
+     is len(ip) times the step and kills the relu units)
+    -hidden_size: width of the hidden layer
+    -iterations: max passes over the data
+    -batch_size: rows per update, None for full batch
+    -tol/patience: stop once the epoch error has not dropped by more than tol
+     (relative) for patience passes, None to always run every iteration
+    returns:
+    -weights_0_1, weights_1_2 and the squared error of each pass
+    '''
+    ip = np.asarray(ip, dtype=float)
+    gp = np.asarray(gp, dtype=float).reshape(-1,1)
+    weights_0_1, weights_1_2 = init_weights(ip.shape[1], hidden_size, seed)
+
+    n = len(ip)
+    step = n if batch_size is None else batch_size
+    errors = []
+    best = np.inf
+    stale = 0
+
+    for iteration in range(iterations):
+        layer_2_error = 0
+        for i in range(0, n, step):
+            layer_0 = ip[i:i+step]
+            layer_1 = relu(layer_0.dot(weights_0_1))
+            layer_2 = layer_1.dot(weights_1_2)
+            layer_2_error += np.sum((layer_2 - gp[i:i+step]) ** 2)
+
+            layer_2_delta = (gp[i:i+step] - layer_2)
+            layer_1_delta = layer_2_delta.dot(weights_1_2.T) * relu2deriv(layer_1)
+
+            #mean over the batch rows, not the sum
+            rate = alpha / len(layer_0)
+            weights_1_2 += rate * layer_1.T.dot(layer_2_delta)
+            weights_0_1 += rate * layer_0.T.dot(layer_1_delta)
+
+        errors.append(layer_2_error)
+        if not np.isfinite(layer_2_error): #alpha too big for this batch size
+            break
+        if verbose and iteration % 1000 == 999:
+            print("Error: " + str(layer_2_error))
+
+        if tol is not None:
+            if layer_2_error < best * (1 - tol):
+                best = layer_2_error
+                stale = 0
+            else:
+                stale += 1
+                if stale >= patience:
+                    break
+
+    return weights_0_1, weights_1_2, np.array(errors)
+
+
+def forward(ip, weights_0_1, weights_1_2, chunk_size=100000):
+    '''
+    full forward pass (input -> relu hidden layer -> output) in row chunks
+    so the hidden layer never has to exist for every row at once
+    '''
+    ip = np.asarray(ip, dtype=float)
+    out = np.empty((len(ip),1))
+    for i in range(0, len(ip), chunk_size):
+        out[i:i+chunk_size] = relu(ip[i:i+chunk_size].dot(weights_0_1)).dot(weights_1_2)
+    return out
+
+
+def predict(ip, weights_0_1, weights_1_2, threshold=0.5, chunk_size=100000):
+    '''
+    returns: 0/1 predictions, one per row
+    '''
+    return (forward(ip, weights_0_1, weights_1_2, chunk_size)[:,0] >= threshold).astype(int)
+
+
+def write_submission(csv_in, csv_out, features, weights_0_1, weights_1_2,
+                     threshold=0.5, chunksize=100000):
+    '''
+    streams csv_in in chunks: features.transform -> predict -> append the
+    PassengerId/Survived rows to csv_out, nothing is kept in memory between chunks
+
+    takes:
+    -csv_in: raw records to score (test.csv layout)
+    -csv_out: submission file, overwritten
+    -features: fitted TitanicFeatures (anything with a transform)
+    returns:
+    -number of rows written
+    '''
+    import pandas as pd
+
+    rows = 0
+    for i, chunk in enumerate(pd.read_csv(csv_in, chunksize=chunksize)):
+        ip = features.transform(chunk).values
+        sub = pd.DataFrame({'PassengerId': chunk['PassengerId'].values,
+                            'Survived': predict(ip, weights_0_1, weights_1_2, threshold)})
+        sub.to_csv(csv_out, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        rows += len(sub)
+    return rows
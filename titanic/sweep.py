@@ -0,0 +1,102 @@
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from network import train, predict
+
+
+PARAMS = ['alpha', 'hidden_size', 'iterations', 'seed']
+
+#set in each worker by _attach, views onto the parent's shared block
+_SHARED = {}
+
+
+#alpha is the step on the mean batch gradient (network.train), .02 at batch_size=32
+#is the old summed .0006
+def param_grid(alpha=(.02,), hidden_size=(8,), iterations=(10000,), seed=(1,)):
+    '''
+    returns: every combination of the given values, as a list of dicts
+    '''
+    return [dict(zip(PARAMS, values)) for values in itertools.product(alpha, hidden_size, iterations, seed)]
+
+
+def param_sample(n, alpha=(.003, .03), hidden_size=(4, 16), iterations=(1000, 10000), random_state=0):
+    '''
+    returns: n random configs - alpha log-uniform, hidden_size/iterations uniform
+    integers between the given bounds, a fresh seed each
+    '''
+    rng = np.random.RandomState(random_state)
+    return [{'alpha': float(np.exp(rng.uniform(np.log(alpha[0]), np.log(alpha[1])))),
+             'hidden_size': int(rng.randint(hidden_size[0], hidden_size[1] + 1)),
+             'iterations': int(rng.randint(iterations[0], iterations[1] + 1)),
+             'seed': int(rng.randint(0, 2**31 - 1))} for _ in range(n)]
+
+
+def kfold(n, folds, random_state=0):
+    order = np.random.RandomState(random_state).permutation(n)
+    return np.array_split(order, folds)
+
+
+def _attach(name, shape, options):
+    shm = shared_memory.SharedMemory(name=name)
+    block = np.ndarray(shape, dtype=float, buffer=shm.buf)
+    _SHARED.update(shm=shm, ip=block[:, :-1], gp=block[:, -1], **options)
+
+
+def _evaluate(config):
+    ip, gp = _SHARED['ip'], _SHARED['gp']
+    start = time.perf_counter()
+
+    scores = []
+    errors = []
+    for test in kfold(len(ip), _SHARED['folds'], _SHARED['fold_seed']):
+        mask = np.ones(len(ip), dtype=bool)
+        mask[test] = False
+        weights_0_1, weights_1_2, error = train(ip[mask], gp[mask], alpha=config['alpha'],
+                                                hidden_size=config['hidden_size'],
+                                                iterations=config['iterations'], seed=config['seed'],
+                                                batch_size=_SHARED['batch_size'], tol=_SHARED['tol'],
+                                                patience=_SHARED['patience'])
+        scores.append(np.mean(predict(ip[test], weights_0_1, weights_1_2) == gp[test]))
+        errors.append(error[-1] / mask.sum())
+
+    return dict(config, accuracy=np.mean(scores), accuracy_std=np.std(scores),
+                train_mse=np.mean(errors), seconds=time.perf_counter() - start)
+
+
+def sweep(ip, gp, configs, folds=5, processes=None, batch_size=32, tol=1e-6, patience=20, fold_seed=0):
+    '''
+    k-fold cross validation of every config across a process pool
+
+    takes:
+    -ip, gp: feature matrix (ex: TitanicFeatures().fit_transform(train_df)) and targets,
+     copied once into shared memory that every worker reads without copying
+    -configs: list of dicts from param_grid / param_sample
+    -folds, fold_seed: the same folds are used for every config
+    -batch_size, tol, patience: passed to network.train
+    returns:
+    -one row per config with mean/std fold accuracy, train mse and wall time,
+     best accuracy first
+    '''
+    ip = np.asarray(ip, dtype=float)
+    gp = np.asarray(gp, dtype=float).reshape(-1, 1)
+    shape = (len(ip), ip.shape[1] + 1)
+
+    shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+    try:
+        np.ndarray(shape, dtype=float, buffer=shm.buf)[:] = np.hstack([ip, gp])
+        options = {'folds': folds, 'fold_seed': fold_seed, 'batch_size': batch_size,
+                   'tol': tol, 'patience': patience}
+        with ProcessPoolExecutor(max_workers=processes, initializer=_attach,
+                                 initargs=(shm.name, shape, options)) as pool:
+            results = list(pool.map(_evaluate, configs))
+    finally:
+        shm.close()
+        shm.unlink()
+
+    results = pd.DataFrame(results, columns=PARAMS + ['accuracy', 'accuracy_std', 'train_mse', 'seconds'])
+    return results.sort_values('accuracy', ascending=False).reset_index(drop=True)
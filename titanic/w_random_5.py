@@ -1,180 +1,33 @@
 import pandas as pd
 import numpy as np
-import random as rnd
-import csv
+
+from features import TitanicFeatures
+from network import train, write_submission
 
 train_df = pd.read_csv('/Users/name/PycharmProjects/titanic/train.csv')
 test_df = pd.read_csv('/Users/name/PycharmProjects/titanic/test.csv')
-combine = [train_df, test_df]
-
-for dataset in combine:
-    dataset['Title'] = dataset.Name.str.extract(' ([A-Za-z]+)\.', expand=False)
-
-pd.crosstab(train_df['Title'], train_df['Sex'])
-
-for dataset in combine:
-    dataset['Title'] = dataset.Name.str.extract(' ([A-Za-z]+)\.', expand=False)
-
-pd.crosstab(train_df['Title'], train_df['Sex'])
-
-for dataset in combine:
-    dataset['Title'] = dataset['Title'].replace(['Lady', 'Countess', 'Capt', 'Col', 'Don', 'Dr', 'Major', 'Rev', 'Sir', 'Jonkheer', 'Dona'], 'Rare')
-    dataset['Title'] = dataset['Title'].replace('Mlle', 'Miss')
-    dataset['Title'] = dataset['Title'].replace('Ms', 'Miss')
-    dataset['Title'] = dataset['Title'].replace('Mme', 'Mrs')
-
-train_df[['Title', 'Survived']].groupby(['Title'], as_index=False).mean()
-
-title_mapping = {"Mr": 1, "Miss": 2, "Mrs": 3, "Master": 4, "Rare": 5}
-for dataset in combine:
-    dataset['Title'] = dataset['Title'].map(title_mapping)
-    dataset['Title'] = dataset['Title'].fillna(0)
-
-train_df.head()
-
-train_df = train_df.drop(['Ticket', 'Cabin'], axis=1)
-test_df = test_df.drop(['Ticket', 'Cabin'], axis=1)
-train_df = train_df.drop(['Name', 'PassengerId'], axis=1)
-test_df = test_df.drop(['Name'], axis=1)
-combine = [train_df, test_df]
-
-for dataset in combine:
-    dataset['Sex'] = dataset['Sex'].map( {'female': 1, 'male': 0} ).astype(int)
-
-guess_ages = np.zeros((2,3))
-guess_ages
-
-for dataset in combine:
-    for i in range(0, 2):
-        for j in range(0, 3):
-            guess_df = dataset[(dataset['Sex'] == i) & \
-                               (dataset['Pclass'] == j + 1)]['Age'].dropna()
-
-            # age_mean = guess_df.mean()
-            # age_std = guess_df.std()
-            # age_guess = rnd.uniform(age_mean - age_std, age_mean + age_std)
-
-            age_guess = guess_df.median()
-
-            # Convert random age float to nearest .5 age
-            guess_ages[i, j] = int(age_guess / 0.5 + 0.5) * 0.5
-
-    for i in range(0, 2):
-        for j in range(0, 3):
-            dataset.loc[(dataset.Age.isnull()) & (dataset.Sex == i) & (dataset.Pclass == j + 1), \
-                        'Age'] = guess_ages[i, j]
-
-    dataset['Age'] = dataset['Age'].astype(int)
-
-train_df.head()
-
-for dataset in combine:
-    dataset.loc[ dataset['Age'] <= 16, 'Age'] = 0
-    dataset.loc[(dataset['Age'] > 16) & (dataset['Age'] <= 32), 'Age'] = 1
-    dataset.loc[(dataset['Age'] > 32) & (dataset['Age'] <= 48), 'Age'] = 2
-    dataset.loc[(dataset['Age'] > 48) & (dataset['Age'] <= 64), 'Age'] = 3
-    dataset.loc[ dataset['Age'] > 64, 'Age']
-
-for dataset in combine:
-    dataset['FamilySize'] = dataset['SibSp'] + dataset['Parch'] + 1
-
-train_df[['FamilySize', 'Survived']].groupby(['FamilySize'], as_index=False).mean().sort_values(by='Survived', ascending=False)
-
-for dataset in combine:
-    dataset['IsAlone'] = 0
-    dataset.loc[dataset['FamilySize'] == 1, 'IsAlone'] = 1
 
-train_df[['IsAlone', 'Survived']].groupby(['IsAlone'], as_index=False).mean()
+#title, sex, age/fare bands, family and port features - fit on train only
+features = TitanicFeatures().fit(train_df)
 
-train_df = train_df.drop(['Parch', 'SibSp', 'FamilySize'], axis=1)
-test_df = test_df.drop(['Parch', 'SibSp', 'FamilySize'], axis=1)
-combine = [train_df, test_df]
-
-for dataset in combine:
-    dataset['Age*Class'] = dataset.Age * dataset.Pclass
-
-freq_port = train_df.Embarked.dropna().mode()[0]
-
-for dataset in combine:
-    dataset['Embarked'] = dataset['Embarked'].fillna(freq_port)
-
-train_df[['Embarked', 'Survived']].groupby(['Embarked'], as_index=False).mean().sort_values(by='Survived', ascending=False)
-
-for dataset in combine:
-    dataset['Embarked'] = dataset['Embarked'].map( {'S': 0, 'C': 1, 'Q': 2} ).astype(int)
-
-test_df['Fare'].fillna(test_df['Fare'].dropna().median(), inplace=True)
-
-train_df['FareBand'] = pd.qcut(train_df['Fare'], 4)
-train_df[['FareBand', 'Survived']].groupby(['FareBand'], as_index=False).mean().sort_values(by='FareBand', ascending=True)
-
-for dataset in combine:
-    dataset.loc[ dataset['Fare'] <= 7.91, 'Fare'] = 0
-    dataset.loc[(dataset['Fare'] > 7.91) & (dataset['Fare'] <= 14.454), 'Fare'] = 1
-    dataset.loc[(dataset['Fare'] > 14.454) & (dataset['Fare'] <= 31), 'Fare']   = 2
-    dataset.loc[ dataset['Fare'] > 31, 'Fare'] = 3
-    dataset['Fare'] = dataset['Fare'].astype(int)
-
-train_df = train_df.drop(['FareBand'], axis=1)
-combine = [train_df, test_df]
-
-X_train = train_df.drop("Survived", axis=1)
+X_train = features.transform(train_df)
 Y_train = train_df["Survived"]
 
 #neural network
-np.random.seed(1)
-
-def relu(x):
-    return (x>0) * x
-
-def relu2deriv(output):
-    return output>0
-
 ip = np.array(X_train)
 gp = np.array(Y_train)
 
-alpha = .0006 #.0006, .0005
+alpha = .02 #step on the mean batch gradient, .0006 at batch_size=1
 hidden_size = 8
 
-weights_0_1 = 2*np.random.random((8,hidden_size)) - 1
-weights_1_2 = 2*np.random.random((hidden_size,1)) - 1
-
-for iteration in range(10000):
-    layer_2_error = 0
-    for i in range(len(ip)):
-        layer_0 = ip[i:i+1]
-        layer_1 = relu(np.dot(layer_0,weights_0_1))
-        layer_2 = np.dot(layer_1,weights_1_2)
-        layer_2_error += np.sum((layer_2 - gp[i:i+1]) ** 2)
-
-        layer_2_delta = (gp[i:i+1] - layer_2)
-        layer_1_delta = layer_2_delta.dot(weights_1_2.T) * relu2deriv(layer_1)
-
-        weights_1_2 += alpha * layer_1.T.dot(layer_2_delta)
-        weights_0_1 += alpha * layer_0.T.dot(layer_1_delta)
-
-    if(iteration % 10000 == 9999):
-        print("Error: " + str(layer_2_error))
-
-X_test  = test_df.drop("PassengerId", axis=1).copy()
-
-ip_2 = np.array(X_test)
-
-input_2 = ip_2.dot(weights_1_2)
-
-for row_index in range(len(input_2)):
-    input_2[row_index] = input_2[row_index]/100
-
-for row_index in range(len(input_2)):
-    if input_2[row_index] >=0.5:
-        input_2[row_index] = 1
-    else:
-        input_2[row_index] = 0
+#batch_size=1 reproduces the old row by row loop, tol stops once the error flattens
+weights_0_1, weights_1_2, errors = train(ip, gp, alpha=alpha, hidden_size=hidden_size,
+                                         iterations=10000, batch_size=32, tol=1e-6, patience=20)
 
-sub = pd.DataFrame(input_2)
-sub2 = pd.DataFrame(test_df['PassengerId'])
-submission = pd.concat([sub2, sub], axis=1)
+print("Error: " + str(errors[-1]))
 
-print(submission)
+#score the test file in chunks and write the submission as it goes
+rows = write_submission('/Users/name/PycharmProjects/titanic/test.csv', '/Users/titanic/submission_3.csv',
+                        features, weights_0_1, weights_1_2)
 
-submission.to_csv('/Users/titanic/submission_3.csv', index=False)
+print(pd.read_csv('/Users/titanic/submission_3.csv'))
@@ -0,0 +1,146 @@
+import os
+import copy
+import json
+import time
+import pickle
+import hashlib
+
+import numpy as np
+import scipy.sparse as sp
+
+from .models import TopSnippetIndex
+
+FORMAT_VERSION = 1
+
+#large fitted arrays kept as .npy so loads can memory map them
+MODEL_ARRAYS = ('components_', 'exp_dirichlet_component_')
+
+BUNDLE_FILES = ('params.json', 'doc_topic.npy', 'top_docs.npy', 'vocabulary.json', 'model.pkl', 'vectorizer.pkl')
+
+
+def fingerprint(vec_data):
+	'''
+	sha1 of the vectorized input (shape, dtype and values)
+	'''
+	h = hashlib.sha1()
+	if sp.issparse(vec_data):
+		csr = sp.csr_matrix(vec_data)
+		csr.sort_indices()
+		arrays = [csr.data, csr.indices, csr.indptr]
+	else:
+		arrays = [np.ascontiguousarray(vec_data)]
+	h.update(repr(vec_data.shape).encode('utf-8'))
+	for a in arrays:
+		h.update(a.dtype.str.encode('utf-8'))
+		h.update(a.tobytes())
+	return h.hexdigest()
+
+
+def _estimator(model):
+	#the step holding components_ (LSA is a pipeline of svd + normalizer)
+	return model.steps[0][1] if hasattr(model, 'steps') else model
+
+
+def save_artifact(path, method, model, doc_topic, terms, vec_data=None, vectorizor=None, top_docs=1000):
+	'''
+	takes:
+		path --> folder for the bundle, created if needed
+		method --> 'lda', 'lsa' or 'nmf'
+		model --> the fitted model
+		doc_topic --> document-topic matrix from fit_transform
+		terms --> feature names of the vectorizer
+		vec_data --> vectorized input, fingerprinted so a stale bundle can be spotted
+		vectorizor --> fitted vectorizer, pickled for scoring new documents
+		top_docs --> documents kept per topic in the TopSnippetIndex, 0 to skip
+	returns:
+		path
+	'''
+	os.makedirs(path, exist_ok=True)
+	#params.json first marks the old bundle incomplete, then every file it may have
+	#written goes, so an old index/vectorizer is never paired with the new model
+	for name in BUNDLE_FILES + tuple(a.strip('_') + '.npy' for a in MODEL_ARRAYS):
+		if os.path.exists(os.path.join(path, name)):
+			os.remove(os.path.join(path, name))
+	estimator = _estimator(model)
+
+	#the arrays go to .npy, the pickle (of a shallow copy) keeps the rest of the model
+	light = copy.copy(model)
+	if hasattr(light, 'steps'):
+		light.steps = [(light.steps[0][0], copy.copy(estimator))] + list(light.steps[1:])
+	light_est = _estimator(light)
+	arrays = [a for a in MODEL_ARRAYS if getattr(estimator, a, None) is not None]
+	for a in arrays:
+		np.save(os.path.join(path, a.strip('_') + '.npy'), getattr(estimator, a))
+		setattr(light_est, a, None)
+
+	np.save(os.path.join(path, 'doc_topic.npy'), np.asarray(doc_topic))
+	if top_docs:
+		TopSnippetIndex.build(doc_topic, top_docs).save(os.path.join(path, 'top_docs.npy'))
+	with open(os.path.join(path, 'vocabulary.json'), 'w') as f:
+		json.dump([str(t) for t in terms], f)
+	with open(os.path.join(path, 'model.pkl'), 'wb') as f:
+		pickle.dump(light, f, protocol=pickle.HIGHEST_PROTOCOL)
+	if vectorizor is not None:
+		with open(os.path.join(path, 'vectorizer.pkl'), 'wb') as f:
+			pickle.dump(vectorizor, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+	params = {'format_version': FORMAT_VERSION,
+		  'method': method,
+		  'ntopics': int(np.asarray(doc_topic).shape[1]),
+		  'n_docs': int(np.asarray(doc_topic).shape[0]),
+		  'n_terms': len(terms),
+		  'model_arrays': arrays,
+		  'model_params': {k: repr(v) for k, v in estimator.get_params().items()},
+		  'fingerprint': None if vec_data is None else fingerprint(vec_data),
+		  'created': time.strftime('%Y-%m-%dT%H:%M:%S')}
+	#params.json goes last, a bundle without it is incomplete
+	with open(os.path.join(path, 'params.json'), 'w') as f:
+		json.dump(params, f, indent=1)
+	return path
+
+
+class TopicArtifact:
+	'''
+	a saved topic model bundle, arrays memory mapped read only by default so
+	every serving process shares the same pages
+
+	attributes: params, terms, components, doc_topic, top_docs (TopSnippetIndex
+	or None), model (fitted, arrays mapped back in), vectorizer (or None)
+	'''
+
+	def __init__(self, path, mmap_mode='r'):
+		with open(os.path.join(path, 'params.json')) as f:
+			self.params = json.load(f)
+		if self.params['format_version'] > FORMAT_VERSION:
+			raise ValueError('artifact format %s is newer than this code (%s)'
+					 % (self.params['format_version'], FORMAT_VERSION))
+		self.path = path
+
+		with open(os.path.join(path, 'vocabulary.json')) as f:
+			self.terms = json.load(f)
+		self.doc_topic = np.load(os.path.join(path, 'doc_topic.npy'), mmap_mode=mmap_mode)
+		top_docs = os.path.join(path, 'top_docs.npy')
+		self.top_docs = TopSnippetIndex.load(top_docs, mmap_mode) if os.path.exists(top_docs) else None
+
+		with open(os.path.join(path, 'model.pkl'), 'rb') as f:
+			self.model = pickle.load(f)
+		estimator = _estimator(self.model)
+		for a in self.params['model_arrays']:
+			setattr(estimator, a, np.load(os.path.join(path, a.strip('_') + '.npy'), mmap_mode=mmap_mode))
+		self.components = estimator.components_
+
+		vectorizer = os.path.join(path, 'vectorizer.pkl')
+		self.vectorizer = None
+		if os.path.exists(vectorizer):
+			with open(vectorizer, 'rb') as f:
+				self.vectorizer = pickle.load(f)
+
+	def matches(self, vec_data):
+		'''
+		True when vec_data is the input the bundle was fitted on
+		'''
+		return self.params['fingerprint'] == fingerprint(vec_data)
+
+
+def load_artifact(path, mmap_mode='r'):
+	return TopicArtifact(path, mmap_mode)
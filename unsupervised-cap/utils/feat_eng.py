@@ -1,7 +1,15 @@
-from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer, HashingVectorizer
+from sklearn.preprocessing import normalize
+import scipy.sparse as sp
+import numpy as np
 
+from .stream import chunked
 
-def bag_of_words():
+
+def bag_of_words(streaming=False, hashing=False):
+	if streaming:
+		return StreamingVectorizer(hashing=hashing, max_features=None if hashing else 5000,
+					   use_idf=False, norm=None)
 	return CountVectorizer(analyzer = "word",   
                            tokenizer = None,    
                            preprocessor = None, 
@@ -9,11 +17,133 @@ def bag_of_words():
                            max_features = 5000
                         )
 
-def tfidf(max_df,min_df):
+def tfidf(max_df,min_df, streaming=False, hashing=False):
+	if streaming:
+		return StreamingVectorizer(hashing=hashing, max_df=max_df, min_df=min_df,
+					   use_idf=True, norm='l2')
 	return TfidfVectorizer(max_df=max_df, 
                            min_df=min_df, 
                            lowercase=True, 
                            use_idf=True,
                            norm=u'l2', 
                            smooth_idf=True 
-                         )
\ No newline at end of file
+                         )
+
+
+def _tokens(doc):
+	#documents come in already tokenized (process.preprocess_stream)
+	return doc
+
+
+class StreamingVectorizer:
+	'''
+	out-of-core counts / tf-idf over pre-tokenized documents
+
+	takes token lists straight from a generator (no ', '.join and re-tokenize),
+	fit is a single streaming pass collecting document frequencies, transform
+	yields one CSR matrix per chunk so the corpus never sits in memory
+
+	hashing=True uses a HashingVectorizer (no vocabulary, n_features columns),
+	otherwise the vocabulary is built chunk by chunk and trimmed with
+	min_df/max_df/max_features like CountVectorizer (hashed columns outside
+	the limits are zeroed instead). idf is the smoothed
+	sklearn idf, rows are normalized with norm (None to skip)
+	'''
+
+	def __init__(self, hashing=False, n_features=2**18, max_features=None, min_df=1, max_df=1.0,
+		     use_idf=True, norm='l2', chunksize=10000):
+		self.hashing = hashing
+		self.n_features = n_features
+		self.max_features = max_features
+		self.min_df = min_df
+		self.max_df = max_df
+		self.use_idf = use_idf
+		self.norm = norm
+		self.chunksize = chunksize
+
+	def _counter(self):
+		if self.hashing:
+			return HashingVectorizer(analyzer=_tokens, n_features=self.n_features,
+						 alternate_sign=False, norm=None)
+		return CountVectorizer(analyzer=_tokens, vocabulary=self.vocabulary_)
+
+	def _df_limit(self, limit, n_docs):
+		return limit if isinstance(limit, (int, np.integer)) else limit * n_docs
+
+	def _keep(self, df, tf, n_docs):
+		#columns inside min_df/max_df, then the max_features highest corpus counts
+		keep = np.flatnonzero((df >= self._df_limit(self.min_df, n_docs))
+				      & (df <= self._df_limit(self.max_df, n_docs)))
+		if self.max_features is not None and len(keep) > self.max_features:
+			#highest corpus counts, ties broken by column order (alphabetical terms)
+			keep = np.sort(keep[np.argsort(-tf[keep], kind='mergesort')[:self.max_features]])
+		return keep
+
+	def fit(self, docs):
+		n_docs = 0
+		if self.hashing:
+			counter = self._counter()
+			df = np.zeros(self.n_features, dtype=np.int64)
+			tf = np.zeros(self.n_features, dtype=np.int64)
+			for chunk in chunked(docs, self.chunksize):
+				X = counter.transform(chunk)
+				df += np.bincount(X.indices, minlength=self.n_features)
+				tf += np.bincount(X.indices, weights=X.data, minlength=self.n_features).astype(np.int64)
+				n_docs += X.shape[0]
+			#no vocabulary to trim, columns outside the limits are zeroed in transform;
+			#columns unseen at fit stay (new terms) unless max_features caps the count
+			self.mask_ = (df == 0) if self.max_features is None else np.zeros(self.n_features, dtype=bool)
+			self.mask_[self._keep(df, tf, n_docs)] = True
+		else:
+			df, tf = {}, {}
+			for chunk in chunked(docs, self.chunksize):
+				cv = CountVectorizer(analyzer=_tokens)
+				X = cv.fit_transform(chunk).tocsc()
+				terms = cv.get_feature_names_out()
+				chunk_df = np.diff(X.indptr)
+				chunk_tf = np.asarray(X.sum(axis=0)).ravel()
+				for term, d, t in zip(terms, chunk_df, chunk_tf):
+					term = str(term) #plain str keys, not np.str_
+					df[term] = df.get(term, 0) + d
+					tf[term] = tf.get(term, 0) + t
+				n_docs += X.shape[0]
+
+			terms = sorted(df)
+			df = np.array([df[t] for t in terms], dtype=np.int64)
+			tf = np.array([tf[t] for t in terms], dtype=np.int64)
+			keep = self._keep(df, tf, n_docs)
+			df = df[keep]
+			self.vocabulary_ = {terms[k]: i for i, k in enumerate(keep)}
+			self.mask_ = None
+
+		self.n_docs_ = n_docs
+		self.df_ = df
+		self.idf_ = np.log((1 + n_docs) / (1 + df)) + 1
+		return self
+
+	def transform(self, docs):
+		'''
+		returns: generator of CSR matrices, one per chunk of docs
+		'''
+		counter = self._counter()
+		scale = self.idf_ if self.use_idf else None
+		mask = getattr(self, 'mask_', None)
+		if mask is not None and not mask.all():
+			scale = mask * (1.0 if scale is None else scale) #hashed columns outside the df limits
+		scale = sp.diags(scale) if scale is not None else None
+		for chunk in chunked(docs, self.chunksize):
+			X = counter.transform(chunk).astype(np.float64)
+			if scale is not None:
+				X = X @ scale
+				X.eliminate_zeros()
+			if self.norm is not None:
+				X = normalize(X, norm=self.norm, copy=False)
+			yield X.tocsr()
+
+	def transform_all(self, docs):
+		return sp.vstack(list(self.transform(docs)), format='csr')
+
+	def get_feature_names(self):
+		if self.hashing:
+			return ['hash_%d' % i for i in range(self.n_features)]
+		return list(self.vocabulary_)
@@ -0,0 +1,42 @@
+import os
+import sys
+import resource
+import threading
+
+
+def _rss():
+	#resident set size in bytes, peak-so-far where /proc is not available
+	try:
+		with open('/proc/self/statm') as f:
+			return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+	except OSError:
+		peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class PeakMemory:
+	'''
+	samples the process RSS on a thread while the block runs;
+	peak_mb is the highest RSS seen above the RSS at entry
+	(tracemalloc would be exact but slows LDA down ~10x)
+	'''
+
+	def __init__(self, interval=0.005):
+		self.interval = interval
+
+	def __enter__(self):
+		self.base = self.peak = _rss()
+		self._stop = threading.Event()
+		self._thread = threading.Thread(target=self._sample, daemon=True)
+		self._thread.start()
+		return self
+
+	def _sample(self):
+		while not self._stop.wait(self.interval):
+			self.peak = max(self.peak, _rss())
+
+	def __exit__(self, *exc):
+		self._stop.set()
+		self._thread.join()
+		self.peak = max(self.peak, _rss())
+		self.peak_mb = (self.peak - self.base) / 2**20
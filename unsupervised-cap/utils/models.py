@@ -5,36 +5,97 @@ from sklearn.preprocessing import Normalizer
 from sklearn.decomposition import LatentDirichletAllocation as LDA
 from sklearn.decomposition import NMF
 
-from itertools import combinations
+import weakref
 import pandas as pd
 import numpy as np
 
 
-def get_top_snippets( all_snippets, W, topic_index, top ):
-    # reverse sort the values to sort the indices
-    top_indices = np.argsort( W[:,topic_index] )[::-1]
+def get_top_snippets( all_snippets, W, topic_index, top, page=0 ):
+    # W is the document-topic matrix or a TopSnippetIndex built from it
+    if isinstance(W, TopSnippetIndex):
+        top_indices = W.top(topic_index, top, page)
+    else:
+        # partition for the top ranked indices instead of sorting every document
+        top_indices = top_k(W[:, [topic_index]], (page+1)*top)[page*top:, 0]
     # now get the snippets corresponding to the top-ranked indices
     
-    return [all_snippets[doc_index] for doc_index in top_indices[0:top]]
+    return [all_snippets[doc_index] for doc_index in top_indices]
 
 
-def calculate_coherence(w2v_model, term_rankings):
+class TopSnippetIndex:
     '''
-    takes:
-    -w2v model
-    -term rankings (calculated by top_term)
-    returns:
-    -ratio of overall coherence/number of term rankings
+    top k documents of every topic, ranked once after fitting
+
+    index = TopSnippetIndex.build(W, k=1000); index.save('top_docs.npy')
+    TopSnippetIndex.load('top_docs.npy') memory maps the file, so a page of
+    any topic is a slice of one contiguous row: O(top) per call
     '''
-    overall_coherence = 0.0
-    for topic_index in range(len(term_rankings)):
-        # check each pair of terms
-        pair_scores = [w2v_model.wv.similarity(p[0],p[1]) for p in combinations(term_rankings[topic_index],2)]
-        topic_score = sum(pair_scores) / len(pair_scores)
-        overall_coherence += topic_score
+
+    def __init__(self, order):
+        self.order = order # topics x k document indices, best first
+
+    @classmethod
+    def build(cls, W, k=1000):
+        return cls(np.ascontiguousarray(top_k(np.asarray(W), k).T))
+
+    def top(self, topic_index, top=10, page=0):
+        return np.asarray(self.order[topic_index, page*top:(page+1)*top])
+
+    def save(self, path):
+        np.save(path, self.order)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        return cls(np.load(path, mmap_mode=mmap_mode))
+
+
+#unit length word vectors already looked up, per w2v model, reused across calls
+_TERM_VECTORS = weakref.WeakKeyDictionary()
+
+
+def term_vectors(w2v_model, terms):
+	'''
+	takes:
+	-w2v model
+	-list of terms
+	returns:
+	-len(terms) x dim matrix of unit length vectors (cached per model)
+	'''
+	cache = _TERM_VECTORS.setdefault(w2v_model, {})
+	missing = [t for t in set(terms) if t not in cache]
+	if missing:
+		vectors = np.array([w2v_model.wv[t] for t in missing], dtype=np.float64)
+		vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+		cache.update(zip(missing, vectors))
+	return np.array([cache[t] for t in terms])
+
+
+def calculate_coherence(w2v_model, term_rankings):
+	'''
+	takes:
+	-w2v model
+	-term rankings (calculated by top_term)
+	returns:
+	-ratio of overall coherence/number of term rankings
+	'''
+	sizes = {len(terms) for terms in term_rankings}
+	if len(sizes) == 1:
+		# all topics in one block: topics x terms x dim, then every pair at once
+		n = sizes.pop()
+		vectors = term_vectors(w2v_model, [t for terms in term_rankings for t in terms])
+		vectors = vectors.reshape(len(term_rankings), n, -1)
+		sims = np.einsum('tid,tjd->tij', vectors, vectors)
+		i, j = np.triu_indices(n, k=1)
+		topic_scores = sims[:, i, j].mean(axis=1)
+	else:
+		topic_scores = []
+		for terms in term_rankings:
+			vectors = term_vectors(w2v_model, terms)
+			i, j = np.triu_indices(len(terms), k=1)
+			topic_scores.append((vectors @ vectors.T)[i, j].mean())
         
-    # get the mean score across all topics
-    return overall_coherence / len(term_rankings)
+	# get the mean score across all topics
+	return float(np.mean(topic_scores))
 
 #top terms for each topic
 
@@ -52,45 +113,80 @@ def top_term(all_terms, H, topic_index, top):
 
 
 # Linking words to topics
+def word_topic_matrix(vec_data, unsuper_method):
+	'''
+	takes:
+	-vectorized data (sparse or dense, documents x terms)
+	-document-topic matrix from the fitted model
+	returns:
+	-terms x topics loadings as a plain ndarray, no labels attached
+	'''
+	return np.asarray(vec_data.T @ unsuper_method)
+
+
 def word_topic(vec_data, unsuper_method, terms):
 
-	#terms = vectorizor.get_feature_names()
+	#terms = feature_names(vectorizor)
     
     # Loading scores for each word on each topic/component.
-	words_by_topic=vec_data.T * unsuper_method
+	words_by_topic=word_topic_matrix(vec_data, unsuper_method)
 
     # Linking the loadings to the words in an easy-to-read way.
 	components=pd.DataFrame(words_by_topic,index=terms)
     
 	return components
 
-def top_words(components, n_top_words):
-	n_topics = range(components.shape[1])
-	index= np.repeat(n_topics, n_top_words, axis=0)
-	topwords=pd.Series(index=index)
-	for column in range(components.shape[1]):
-	    # Sort the column so that highest loadings are at the top.
-	    sortedwords=components.iloc[:,column].sort_values(ascending=False)
-	    # Choose the N highest loadings.
-	    chosen=sortedwords[:n_top_words]
-	    # Combine loading and index into a string.
-	    chosenlist=chosen.index +" "+round(chosen,2).map(str) 
-	    topwords.loc[column]=[x for x in chosenlist]
-	return(topwords)
+
+def top_k(loadings, k):
+	'''
+	takes:
+	-terms x topics loadings
+	-k
+	returns:
+	-k x topics row indices of the highest loadings, highest first
+	 (argpartition, so O(V) per topic instead of a full sort)
+	'''
+	k = min(k, loadings.shape[0])
+	idx = np.argpartition(-loadings, k-1, axis=0)[:k]
+	order = np.argsort(-np.take_along_axis(loadings, idx, axis=0), axis=0, kind='stable')
+	return np.take_along_axis(idx, order, axis=0)
 
 
-def lda_pipeline(vec_data, ntopics, n_top_words, vectorizor):
+def top_words(components, n_top_words, terms=None):
 	'''
 	takes:
-		vec_data --> vectorized data ex: tfidf, bow
-		ntopics --> integer, number of topics ex: 5
-		n_top_words --> integer, number of words to look for in each topic ex: 10
-		vectorizer --> instance, an instance of the vectorizer ex: tfidf, bow
+	-word_topic DataFrame, or a terms x topics ndarray together with terms
+	-number of words per topic
+	returns:
+	-Series indexed by topic number, "term loading" for the top words of each topic
+	'''
+	if terms is None:
+		loadings, terms = components.values, components.index
+	else:
+		loadings = components
+	terms = np.asarray(terms, dtype=object)
 
+	idx = top_k(loadings, n_top_words)
+	chosen = np.take_along_axis(loadings, idx, axis=0)
+	# Combine loading and index into a string, topic by topic.
+	chosenlist = [terms[i] + " " + str(round(v, 2)) for i, v in zip(idx.T.ravel(), chosen.T.ravel())]
+	index = np.repeat(range(loadings.shape[1]), idx.shape[0], axis=0)
+	return pd.Series(chosenlist, index=index)
+
+
+def feature_names(vectorizor):
+	'''
+	terms of a fitted vectorizer, across sklearn versions
 	'''
+	if hasattr(vectorizor, 'get_feature_names_out'):
+		return list(vectorizor.get_feature_names_out())
+	return vectorizor.get_feature_names()
 
-	#instantiate LDA 
-	lda = LDA(n_components=ntopics, 
+
+#model settings shared by the pipelines and the sweeps
+
+def lda_model(ntopics, n_jobs=-1):
+	return LDA(n_components=ntopics, 
           doc_topic_prior=None, # Prior = 1/n_documents
           topic_word_prior=1/ntopics,
           learning_decay=0.7, # Convergence rate.
@@ -99,85 +195,122 @@ def lda_pipeline(vec_data, ntopics, n_top_words, vectorizor):
           evaluate_every=-1, # Do not evaluate perplexity, as it slows training time.
           mean_change_tol=0.001, # Stop updating the document topic distribution in the E-step when mean change is < tol
           max_doc_update_iter=100, # When to stop updating the document topic distribution in the E-step even if tol is not reached
-          n_jobs=-1, # Use all available CPUs to speed up processing time.
+          n_jobs=n_jobs, # -1 uses all available CPUs to speed up processing time.
           verbose=0, # amount of output to give while iterating
           random_state=0
         )
 
+
+def nmf_model(ntopics, init='nndsvdar'):
+	return NMF(init=init, # how starting value are calculated
+          l1_ratio=0.0, # Sets whether regularization is L2 (0), L1 (1), or a combination (values between 0 and 1)
+          max_iter=200, # when to stop even if the model is not converging (to prevent running forever)
+          n_components=ntopics, 
+          random_state=0, 
+          solver='cd', # Use Coordinate Descent to solve
+          tol=0.0001, # model will stop if tfidf-WH <= tol
+          verbose=0 # amount of output to give while iterating
+         )
+
+
+def lsa_model(ntopics):
+	svd = TruncatedSVD(ntopics)
+	return make_pipeline(svd, Normalizer(copy=False))
+
+
+def lda_pipeline(vec_data, ntopics, n_top_words, vectorizor, save_to=None):
+	'''
+	takes:
+		vec_data --> vectorized data ex: tfidf, bow
+		ntopics --> integer, number of topics ex: 5
+		n_top_words --> integer, number of words to look for in each topic ex: 10
+		vectorizer --> instance, an instance of the vectorizer ex: tfidf, bow
+		save_to --> optional folder, saves the fitted model bundle there (see artifacts.save_artifact)
+
+	'''
+
+	#instantiate LDA 
+	lda = lda_model(ntopics)
+
 	#fit transform the data
 	data_lda = lda.fit_transform(vec_data)
 
-	terms=vectorizor.get_feature_names()
+	terms=feature_names(vectorizor)
 
 	#link the words to topics
-	components_lda = word_topic(vec_data, data_lda, terms)
+	components_lda = word_topic_matrix(vec_data, data_lda)
 
 	df = pd.DataFrame()
 
 	#extract top N words and their loadings for each topic
-	df['LDA']=top_words(components_lda, n_top_words)
+	df['LDA']=top_words(components_lda, n_top_words, terms)
+
+	if save_to is not None:
+		from .artifacts import save_artifact
+		save_artifact(save_to, 'lda', lda, data_lda, terms, vec_data, vectorizor)
 
 	return df
 
 
 #returns components 
-def lsa_pipeline(vec_data, ntopics, n_top_words, vectorizor):
+def lsa_pipeline(vec_data, ntopics, n_top_words, vectorizor, save_to=None):
 	'''
 	takes in vectorized data, topic numbers, and a vectorizor instance
 	returns dataframe with terms and scores for each topic
+	save_to --> optional folder, saves the fitted model bundle there (see artifacts.save_artifact)
 
 	'''
-	svd = TruncatedSVD(ntopics)
-	lsa = make_pipeline(svd, Normalizer(copy=False))
+	lsa = lsa_model(ntopics)
 	data_lsa = lsa.fit_transform(vec_data)
 
 	#getting the word list
-	terms = vectorizor.get_feature_names()
+	terms = feature_names(vectorizor)
 
 	#loading scores for each word on each topic/component
-	components_lsa = word_topic(vec_data, data_lsa, terms)
+	components_lsa = word_topic_matrix(vec_data, data_lsa)
 
 	#linking the loadings to the words in an easy to read way
 
 	df=pd.DataFrame()
 
-	df['LSA']=top_words(components_lsa, n_top_words)
+	df['LSA']=top_words(components_lsa, n_top_words, terms)
+
+	if save_to is not None:
+		from .artifacts import save_artifact
+		save_artifact(save_to, 'lsa', lsa, data_lsa, terms, vec_data, vectorizor)
 
 	return df 
 
 
-def nmf_pipeline(vec_data, ntopics, n_top_words, vectorizor, init='custom'):
+def nmf_pipeline(vec_data, ntopics, n_top_words, vectorizor, init='custom', save_to=None):
 	'''
 	takes:
 		vec_data --> vectorized data ex: tfidf, bow
 		ntopics --> integer, number of topics ex: 5
 		n_top_words --> integer, number of words to look for in each topic ex: 10
 		vectorizer --> instance, an instance of the vectorizer ex: tfidf, bow
+		save_to --> optional folder, saves the fitted model bundle there (see artifacts.save_artifact)
 
 	'''
 
-	#instantiate LDA 
-	nmf = NMF(init='nndsvdar', # how starting value are calculated
-          l1_ratio=0.0, # Sets whether regularization is L2 (0), L1 (1), or a combination (values between 0 and 1)
-          max_iter=200, # when to stop even if the model is not converging (to prevent running forever)
-          n_components=ntopics, 
-          random_state=0, 
-          solver='cd', # Use Coordinate Descent to solve
-          tol=0.0001, # model will stop if tfidf-WH <= tol
-          verbose=0 # amount of output to give while iterating
-         )
+	#instantiate NMF 
+	nmf = nmf_model(ntopics)
 
 	#fit transform the data
 	data_nmf = nmf.fit_transform(vec_data)
 
-	terms=vectorizor.get_feature_names()
+	terms=feature_names(vectorizor)
 
 	#link the words to topics
-	components_nmf = word_topic(vec_data, data_nmf, terms)
+	components_nmf = word_topic_matrix(vec_data, data_nmf)
 
 	df = pd.DataFrame()
 
 	#extract top N words and their loadings for each topic
-	df['NMF']=top_words(components_nmf, n_top_words)
+	df['NMF']=top_words(components_nmf, n_top_words, terms)
+
+	if save_to is not None:
+		from .artifacts import save_artifact
+		save_artifact(save_to, 'nmf', nmf, data_nmf, terms, vec_data, vectorizor)
 
 	return df
\ No newline at end of file
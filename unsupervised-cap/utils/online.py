@@ -0,0 +1,86 @@
+import os
+import pickle
+
+import numpy as np
+from sklearn.decomposition import MiniBatchNMF
+
+from .models import lda_model, top_k
+
+
+class OnlineTopicModel:
+	'''
+	streaming version of lda_pipeline / nmf_pipeline for corpora that grow daily
+
+	1. model = OnlineTopicModel('lda', ntopics=10, checkpoint='topics.pkl')
+	2. model.update(vectorizer.transform(new_docs)) - any iterable of matrix
+	   chunks, ex: StreamingVectorizer.transform; the model takes a partial_fit
+	   step per chunk (online variational Bayes LDA / mini-batch NMF) and is
+	   checkpointed to disk as it goes
+	3. next day: OnlineTopicModel.load('topics.pkl').update(...) carries on from
+	   the saved state instead of refitting from zero
+
+	the columns must mean the same thing in every chunk, so fit the vectorizer
+	once up front, or use hashing=True when the vocabulary keeps growing
+	'''
+
+	def __init__(self, method='lda', ntopics=10, checkpoint=None, total_samples=1e6, checkpoint_every=10):
+		self.method = method
+		self.ntopics = ntopics
+		self.checkpoint = checkpoint
+		self.checkpoint_every = checkpoint_every
+		self.n_docs = 0
+		self.n_batches = 0
+
+		if method == 'lda':
+			#same settings as lda_pipeline, online updates instead of batch
+			self.model = lda_model(ntopics).set_params(learning_method='online', total_samples=total_samples)
+		elif method == 'nmf':
+			#mini-batch counterpart of nmf_model
+			self.model = MiniBatchNMF(n_components=ntopics, init='nndsvdar', l1_ratio=0.0,
+						  max_iter=200, tol=0.0001, random_state=0)
+		else:
+			raise ValueError("method must be 'lda' or 'nmf', got %r" % method)
+
+	def partial_fit(self, X):
+		self.model.partial_fit(X)
+		self.n_docs += X.shape[0]
+		self.n_batches += 1
+		return self
+
+	def update(self, chunks):
+		'''
+		takes: iterable of (documents x terms) chunks
+		returns: self, checkpointed every checkpoint_every chunks and at the end
+		'''
+		for X in chunks:
+			self.partial_fit(X)
+			if self.checkpoint is not None and self.n_batches % self.checkpoint_every == 0:
+				self.save(self.checkpoint)
+		if self.checkpoint is not None:
+			self.save(self.checkpoint)
+		return self
+
+	def transform(self, X):
+		return self.model.transform(X)
+
+	@property
+	def components_(self):
+		return self.model.components_
+
+	def top_terms(self, terms, top=10):
+		'''
+		returns: the top terms of every topic, highest weight first
+		'''
+		terms = np.asarray(terms, dtype=object)
+		return [list(terms[idx]) for idx in top_k(self.components_.T, top).T]
+
+	def save(self, path):
+		tmp_path = path + '.tmp'
+		with open(tmp_path, 'wb') as f:
+			pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+		os.replace(tmp_path, path) #a crash mid write keeps the previous checkpoint
+
+	@classmethod
+	def load(cls, path):
+		with open(path, 'rb') as f:
+			return pickle.load(f)
@@ -1,18 +1,162 @@
+import os
+import json
 import pandas as pd
 import gensim
-import nltk
+from collections import OrderedDict
+from functools import partial
+from multiprocessing import Pool
 from nltk.corpus import stopwords
 from nltk.stem.snowball import SnowballStemmer
-from nltk import bigrams
+
+from .stream import chunked, bounded_map
 
 STEMMER = SnowballStemmer("english", ignore_stopwords=True)
+STOPWORDS = None
+
+
+class StemCache:
+    '''
+    bounded LRU of word -> stem in front of STEMMER
+
+    vocabulary is Zipf distributed, so a few thousand entries answer almost
+    every token; hits/misses are counted, save/load keep it across runs and
+    drain()/merge() hand newly stemmed words from a worker back to the parent
+    '''
+
+    def __init__(self, maxsize=200000, track_new=False):
+        self.maxsize = maxsize
+        self.track_new = track_new
+        self.hits = 0
+        self.misses = 0
+        self._stems = OrderedDict()
+        self._new = {}
+
+    def stem(self, word):
+        try:
+            stemmed = self._stems[word]
+        except KeyError:
+            self.misses += 1
+            stemmed = STEMMER.stem(word)
+            if self.track_new:
+                self._new[word] = stemmed
+            self.update({word: stemmed})
+        else:
+            self.hits += 1
+            self._stems.move_to_end(word)
+        return stemmed
+
+    def update(self, stems):
+        self._stems.update(stems)
+        while len(self._stems) > self.maxsize:
+            self._stems.popitem(last=False)
+
+    def drain(self):
+        #stems and counts since the last drain, for merge() in another process
+        drained = (self._new, self.hits, self.misses)
+        self._new, self.hits, self.misses = {}, 0, 0
+        return drained
+
+    def merge(self, drained):
+        stems, hits, misses = drained
+        self.update(stems)
+        self.hits += hits
+        self.misses += misses
+
+    def info(self):
+        total = self.hits + self.misses
+        return {'size': len(self._stems), 'maxsize': self.maxsize, 'hits': self.hits,
+                'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0}
+
+    def save(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(list(self._stems.items()), f) #oldest first, keeps the LRU order
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        with open(path) as f:
+            self.update(OrderedDict(json.load(f)))
+        return self
+
+
+STEM_CACHE = StemCache()
+
+
+def stopword_set():
+    '''
+    english stopwords, read from the nltk corpus once per process
+    '''
+    global STOPWORDS
+    if STOPWORDS is None:
+        STOPWORDS = frozenset(stopwords.words('english'))
+    return STOPWORDS
+
+
+def tokenize(doc, bigrams=False, stem=False):
+    '''
+    one pass over a single document: tokenize, drop stopwords, stem, add bigrams
+    returns: list of tokens, bigrams ('a_b') first as in preprocess
+    '''
+    sw = stopword_set()
+    tokens = [w for w in gensim.utils.simple_preprocess(doc, min_len=3) if w not in sw]
+    if stem:
+        tokens = [STEM_CACHE.stem(w) for w in tokens]
+    if bigrams:
+        return ['_'.join(x) for x in zip(tokens, tokens[1:])] + tokens
+    return tokens
+
+
+def _tokenize_chunk(docs, bigrams=False, stem=False):
+    #runs in a worker, the new stems go back to the parent's STEM_CACHE
+    return [tokenize(doc, bigrams, stem) for doc in docs], STEM_CACHE.drain()
+
+
+def _init_worker(stem_cache):
+    stopword_set()
+    STEM_CACHE.drain() #forked copies must not report the parent's counts again
+    STEM_CACHE.track_new = True
+    if stem_cache is not None and os.path.exists(stem_cache):
+        STEM_CACHE.load(stem_cache)
+
+
+def preprocess_stream(docs, bigrams=False, stem=False, processes=None, chunksize=1000, stem_cache=None):
+    '''
+    takes:
+    -any iterable of raw documents (Series, list, file lines, generator)
+    -bigrams/stem as in preprocess
+    -processes: worker processes, None for all cpus, 1 to stay in this process
+    -chunksize: documents sent to a worker at a time
+    -stem_cache: json file to warm start STEM_CACHE from (here and in the
+     workers) and to save it back to once the stream is exhausted
+    returns:
+    -generator of token lists in input order; only a few chunks are in flight
+     at once so the full corpus never has to be held in memory
+    '''
+    if stem_cache is not None and os.path.exists(stem_cache):
+        STEM_CACHE.load(stem_cache)
+
+    chunks = chunked(docs, chunksize)
+    work = partial(_tokenize_chunk, bigrams=bigrams, stem=stem)
+
+    if processes == 1:
+        for chunk in chunks:
+            yield from [tokenize(doc, bigrams, stem) for doc in chunk]
+    else:
+        in_flight = 2 * (processes or os.cpu_count())
+        with Pool(processes, initializer=_init_worker, initargs=(stem_cache,)) as pool:
+            for tokens, drained in bounded_map(pool, work, chunks, in_flight):
+                STEM_CACHE.merge(drained)
+                yield from tokens
+
+    if stem_cache is not None:
+        STEM_CACHE.save(stem_cache)
+
 
-def preprocess(text: pd.Series, bigrams=False, stem=False):
-    text = text.apply(gensim.utils.simple_preprocess, min_len=3)
-    sw = set(stopwords.words('english'))
-    
-    text = text.apply(lambda s: [w for w in s if w not in sw])
-    text = text.apply(lambda s: [STEMMER.stem(w) for w in s if stem != False])
-    text = text.apply(lambda s: ['_'.join(x) for x in nltk.bigrams(s) if bigrams != False] + s)
+def preprocess(text: pd.Series, bigrams=False, stem=False, processes=1):
+    '''
+    token lists for a Series of documents, same index; pass processes=None to
+    spread the work over every cpu (see preprocess_stream for the lazy version)
+    '''
+    tokens = preprocess_stream(text, bigrams=bigrams, stem=stem, processes=processes)
 
-    return text
\ No newline at end of file
+    return pd.Series(list(tokens), index=text.index)
@@ -1,6 +1,16 @@
+import os
+import time
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
 import sklearn.metrics as metrics
 from sklearn.metrics import roc_curve, auc
 
+from .mem import PeakMemory
+
 #roc plot
 
 def roc_plot(fpr, tpr, roc_auc):
@@ -20,42 +30,171 @@ def roc_plot(fpr, tpr, roc_auc):
 from sklearn.naive_bayes import MultinomialNB, GaussianNB
 from sklearn.metrics import classification_report, confusion_matrix
 from sklearn.model_selection import train_test_split
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.feature_selection import SelectKBest, chi2
+
+#models that only take dense input, fed the k_best selected columns
+DENSE_MODELS = (GaussianNB, HistGradientBoostingClassifier)
+
+
+def default_models():
+    return {'multinomial_nb': MultinomialNB(),
+            'hist_gb': HistGradientBoostingClassifier(max_iter=500, max_depth=2, random_state=465)}
+
+
+def dense_split(X_train, X_test, y_train, k_best=500):
+    '''
+    dense train/test copies of only the k_best chi2 selected columns
+    '''
+    select = SelectKBest(chi2, k=min(k_best, X_train.shape[1])).fit(X_train, y_train)
+    return select.transform(X_train).toarray(), select.transform(X_test).toarray()
+
+
+def train_classifiers(X, y, models=None, k_best=500, test_size=0.2, random_state=465, plot=False, verbose=True):
+    '''
+    fit every model on one train/test split without densifying the full matrix
+
+    takes:
+        X --> documents x terms, ex: vectorizer.fit_transform(...), kept as CSR
+        y --> labels, ex: data['Text Label'].apply(lambda x: 1 if x=='Non-Bullying' else 0)
+        models --> dict of name: unfitted classifier, default_models() if None;
+                   sparse capable models get the full CSR matrix, DENSE_MODELS
+                   share one dense copy of the k_best chi2 selected columns
+        k_best --> columns kept for the dense models
+        plot --> roc_plot for every model
+        verbose --> print the classification report of every model
+    returns:
+        one row per model with fit seconds, peak extra memory (MB, the dense
+        copy is counted against the first dense model), auc and the fitted
+        model (the same split as train_test_split(X, y, test_size, random_state))
+    '''
+    if models is None:
+        models = default_models()
+
+    X = sp.csr_matrix(X)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size = test_size, random_state = random_state)
+    dense = None
+
+    results = []
+    for name, clf in models.items():
+        needs_dense = isinstance(clf, DENSE_MODELS)
+        start = time.perf_counter()
+        with PeakMemory() as mem:
+            if needs_dense and dense is None:
+                dense = dense_split(X_train, X_test, y_train, k_best)
+            train, test = dense if needs_dense else (X_train, X_test)
+
+            clf.fit(train, y_train)
+            y_pred = clf.predict(test)
+            preds = clf.predict_proba(test)[:, 1]
+
+        fpr, tpr, threshold = metrics.roc_curve(y_test, preds)
+        roc_auc = metrics.auc(fpr, tpr)
+        if verbose:
+            print(name)
+            print(classification_report(y_test, y_pred))
+        if plot:
+            roc_plot(fpr, tpr, roc_auc)
+
+        results.append({'model': name, 'dense': needs_dense, 'seconds': time.perf_counter() - start,
+                        'peak_mb': mem.peak_mb, 'auc': roc_auc, 'fitted': clf})
+
+    return pd.DataFrame(results, columns=['model', 'dense', 'seconds', 'peak_mb', 'auc', 'fitted'])
+
+
+#set in each worker by _init_bench
+_SPLIT = {}
+
+
+def _init_bench(split):
+    _SPLIT.update(split)
+
+
+def _bench(name, clf, batch_size):
+    needs_dense = isinstance(clf, DENSE_MODELS)
+    train, test = _SPLIT['dense'] if needs_dense else _SPLIT['sparse']
+    y_train, y_test = _SPLIT['y']
+
+    start = time.perf_counter()
+    clf.fit(train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    #latency of one predict_proba call per batch, as a scorer would see it
+    latency = []
+    probs = []
+    for i in range(0, test.shape[0], batch_size):
+        start = time.perf_counter()
+        probs.append(clf.predict_proba(test[i:i + batch_size]))
+        latency.append(time.perf_counter() - start)
+    probs = np.vstack(probs)
+    y_pred = clf.classes_[probs.argmax(axis=1)]
 
-clf = GaussianNB()
+    fpr, tpr, threshold = metrics.roc_curve(y_test, probs[:, 1])
+    report = classification_report(y_test, y_pred, output_dict=True)
+    return {'model': name, 'dense': needs_dense, 'fit_seconds': fit_seconds,
+            'predict_p50_ms': 1000 * np.percentile(latency, 50),
+            'predict_p99_ms': 1000 * np.percentile(latency, 99),
+            'model_kb': len(pickle.dumps(clf, protocol=pickle.HIGHEST_PROTOCOL)) / 1024,
+            'auc': metrics.auc(fpr, tpr), 'accuracy': report['accuracy'],
+            'f1_macro': report['macro avg']['f1-score'], 'f1_weighted': report['weighted avg']['f1-score'],
+            'report': classification_report(y_test, y_pred), 'fpr': fpr, 'tpr': tpr}
 
-X = vectorizer.fit_transform(preprocess(data['Tweet']).apply(lambda x: ', '.join(map(str, x))))
-y = data['Text Label'].apply(lambda x: 1 if x=='Non-Bullying' else 0)
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size = 0.2, random_state = 465)
 
-clf.fit(X_train.toarray(),y_train)
-y_pred = clf.predict(X_test.toarray())
+def save_roc(path, fpr, tpr, roc_auc, title='Receiver Operating Characteristic'):
+    '''
+    roc_plot written to an image instead of shown, no pyplot window so it never blocks
+    '''
+    from matplotlib.figure import Figure
+    fig = Figure()
+    ax = fig.subplots()
+    ax.set_title(title)
+    ax.plot(fpr, tpr, 'b', label = 'AUC = %0.2f' % roc_auc)
+    ax.legend(loc = 'lower right')
+    ax.plot([0, 1], [0, 1],'r--')
+    ax.set_xlim([0, 1])
+    ax.set_ylim([0, 1])
+    ax.set_ylabel('True Positive Rate')
+    ax.set_xlabel('False Positive Rate')
+    fig.savefig(path)
 
-print(classification_report(y_test, y_pred))
-probs = clf.predict_proba(X_test.toarray())
-preds = probs[:,1]
-fpr, tpr, threshold = metrics.roc_curve(y_test, preds)
-roc_auc = metrics.auc(fpr, tpr)
-roc_plot(fpr,tpr,roc_auc)
 
-from sklearn import ensemble
-from sklearn.model_selection import cross_val_score
+def benchmark(X_train, X_test, y_train, y_test, models=None, k_best=500, batch_size=100,
+              processes=None, out=None, roc_dir=None):
+    '''
+    compare candidate classifiers on one vectorized train/test split
 
-rfc = ensemble.RandomForestClassifier(n_estimators=100)
+    takes:
+        X_train, X_test, y_train, y_test --> from train_test_split, X kept as CSR
+        models --> dict of name: unfitted classifier, default_models() if None;
+                   DENSE_MODELS get the k_best columns, densified once here
+        batch_size --> test documents per predict call for the latency percentiles
+        processes --> worker processes fitting models side by side, None for all cpus
+        out --> csv path for the comparison table
+        roc_dir --> folder for one <model>_roc.png per model
+    returns:
+        one row per model: fit_seconds, predict_p50_ms / predict_p99_ms per batch,
+        model_kb (pickled size), auc, accuracy, f1 and the classification report
+    '''
+    if models is None:
+        models = default_models()
 
-# We'll make 500 iterations, use 2-deep trees, and set our loss function.
-params = {'n_estimators': 500,
-          'max_depth': 2,
-          'loss': 'deviance'}
+    y = (np.asarray(y_train), np.asarray(y_test))
+    split = {'sparse': (sp.csr_matrix(X_train), sp.csr_matrix(X_test)), 'y': y}
+    if any(isinstance(clf, DENSE_MODELS) for clf in models.values()):
+        split['dense'] = dense_split(split['sparse'][0], split['sparse'][1], y[0], k_best)
 
-# Initialize and fit the model.
-ens = ensemble.GradientBoostingClassifier(**params)
+    #the split is sent once per worker, not once per model
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_bench, initargs=(split,)) as pool:
+        futures = [pool.submit(_bench, name, clf, batch_size) for name, clf in models.items()]
+        results = [future.result() for future in futures]
 
-ens.fit(X_train.toarray(),y_train)
-y_pred = clf.predict(X_test.toarray())
+    if roc_dir is not None:
+        os.makedirs(roc_dir, exist_ok=True)
+        for r in results:
+            save_roc(os.path.join(roc_dir, '%s_roc.png' % r['model']), r['fpr'], r['tpr'], r['auc'], r['model'])
 
-print(classification_report(y_test, y_pred))
-probs = ens.predict_proba(X_test.toarray())
-preds = probs[:,1]
-fpr, tpr, threshold = metrics.roc_curve(y_test, preds)
-roc_auc = metrics.auc(fpr, tpr)
-roc_plot(fpr,tpr,roc_auc)
\ No newline at end of file
+    df = pd.DataFrame(results, columns=['model', 'dense', 'fit_seconds', 'predict_p50_ms', 'predict_p99_ms',
+                                        'model_kb', 'auc', 'accuracy', 'f1_macro', 'f1_weighted', 'report'])
+    if out is not None:
+        df.drop(columns='report').to_csv(out, index=False)
+    return df
@@ -0,0 +1,82 @@
+import os
+import time
+from multiprocessing import Pool
+
+from .artifacts import load_artifact
+from .feat_eng import StreamingVectorizer
+from .process import tokenize
+from .stream import chunked, bounded_map
+
+#set in each worker by _init_worker
+_ARTIFACT = {}
+
+
+def score_batch(artifact, texts, bigrams=False, stem=False):
+	'''
+	takes:
+	-loaded artifact (load_artifact) with its vectorizer
+	-list of raw documents
+	-bigrams/stem as used when the model was fitted
+	returns:
+	-documents x topics distribution
+	'''
+	tokens = [tokenize(t, bigrams, stem) for t in texts]
+	vectorizer = artifact.vectorizer
+	if isinstance(vectorizer, StreamingVectorizer):
+		X = vectorizer.transform_all(tokens)
+	else:
+		#string vectorizers were fitted on the joined tokens
+		X = vectorizer.transform([', '.join(map(str, t)) for t in tokens])
+	return artifact.model.transform(X)
+
+
+def _init_worker(path, bigrams, stem):
+	_ARTIFACT.update(artifact=load_artifact(path), bigrams=bigrams, stem=stem)
+
+
+def _score_worker(texts):
+	return score_batch(_ARTIFACT['artifact'], texts, _ARTIFACT['bigrams'], _ARTIFACT['stem'])
+
+
+def score_stream(artifact, texts, batch_size=1000, processes=1, bigrams=False, stem=False,
+		 stats=None, verbose=False):
+	'''
+	tag incoming documents with a fitted topic model
+
+	takes:
+		artifact --> bundle folder (from save_to=) or a loaded artifact
+		texts --> any iterable of raw documents
+		batch_size --> documents per micro-batch
+		processes --> workers, each maps the bundle once; 1 scores in this process
+		bigrams, stem --> preprocessing used when the model was fitted
+		stats --> optional dict, kept up to date with docs, batches, seconds and docs_per_sec
+		verbose --> print the running throughput after every batch
+	returns:
+		generator of documents x topics arrays, one per batch, in input order
+	'''
+	if stats is None:
+		stats = {}
+	stats.update(docs=0, batches=0, seconds=0.0, docs_per_sec=0.0)
+	start = time.perf_counter()
+
+	def tally(doc_topic):
+		stats['docs'] += len(doc_topic)
+		stats['batches'] += 1
+		stats['seconds'] = time.perf_counter() - start
+		stats['docs_per_sec'] = stats['docs'] / stats['seconds'] if stats['seconds'] else 0.0
+		if verbose:
+			print('%d docs, %.0f docs/sec' % (stats['docs'], stats['docs_per_sec']))
+		return doc_topic
+
+	if processes == 1:
+		if isinstance(artifact, str):
+			artifact = load_artifact(artifact)
+		for batch in chunked(texts, batch_size):
+			yield tally(score_batch(artifact, batch, bigrams, stem))
+		return
+
+	path = artifact if isinstance(artifact, str) else artifact.path
+	in_flight = 2 * (processes or os.cpu_count())
+	with Pool(processes, initializer=_init_worker, initargs=(path, bigrams, stem)) as pool:
+		for doc_topic in bounded_map(pool, _score_worker, chunked(texts, batch_size), in_flight):
+			yield tally(doc_topic)
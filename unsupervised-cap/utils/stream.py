@@ -0,0 +1,35 @@
+from collections import deque
+from itertools import islice
+
+
+def chunked(items, size):
+	'''
+	takes: any iterable and a chunk size
+	returns: generator of lists of up to size items, read lazily
+	'''
+	items = iter(items)
+	while True:
+		chunk = list(islice(items, size))
+		if not chunk:
+			return
+		yield chunk
+
+
+def bounded_map(pool, func, chunks, in_flight):
+	'''
+	takes:
+		pool --> multiprocessing Pool
+		func --> picklable function of one chunk
+		chunks --> iterable of chunks, read only as fast as results are taken
+		in_flight --> chunks submitted but not yet yielded, ex: 2 * processes
+	returns:
+		generator of func(chunk) in input order (Pool.imap reads the whole
+		input ahead, this keeps at most in_flight chunks in memory)
+	'''
+	pending = deque()
+	for chunk in chunks:
+		pending.append(pool.apply_async(func, (chunk,)))
+		while len(pending) >= in_flight or (pending and pending[0].ready()):
+			yield pending.popleft().get()
+	while pending:
+		yield pending.popleft().get()
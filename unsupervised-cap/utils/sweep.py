@@ -0,0 +1,132 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from .mem import PeakMemory
+from .models import lda_model, nmf_model, lsa_model, feature_names, top_k, calculate_coherence
+
+METHODS = ('lda', 'nmf', 'lsa')
+
+#set in each worker by _attach, read only views onto the parent's shared block
+_SHARED = {}
+
+
+def _share(vec_data):
+	#copy the matrix arrays into one shared block so workers map instead of copy
+	if sp.issparse(vec_data):
+		csr = sp.csr_matrix(vec_data)
+		csr.sort_indices()
+		arrays = [csr.data, csr.indices, csr.indptr]
+	else:
+		arrays = [np.ascontiguousarray(vec_data)]
+
+	shm = shared_memory.SharedMemory(create=True, size=max(sum(a.nbytes for a in arrays), 1))
+	layout = []
+	offset = 0
+	for a in arrays:
+		np.ndarray(a.shape, a.dtype, buffer=shm.buf, offset=offset)[:] = a
+		layout.append((a.shape, a.dtype.str, offset))
+		offset += a.nbytes
+	return shm, (sp.issparse(vec_data), vec_data.shape, layout)
+
+
+def _attach(name, spec):
+	sparse, shape, layout = spec
+	shm = shared_memory.SharedMemory(name=name)
+	arrays = [np.ndarray(s, d, buffer=shm.buf, offset=o) for s, d, o in layout]
+	for a in arrays:
+		a.flags.writeable = False
+	if sparse:
+		X = sp.csr_matrix(tuple(arrays), shape=shape, copy=False)
+		X.has_sorted_indices = True
+	else:
+		X = arrays[0]
+	_SHARED.update(shm=shm, X=X)
+
+
+def _grow(W, H, ntopics, avg, seed):
+	#previous factors plus small random columns/rows for the new topics
+	rng = np.random.RandomState(seed)
+	extra = ntopics - W.shape[1]
+	W = np.hstack([W, avg * np.abs(rng.standard_normal((W.shape[0], extra)))])
+	H = np.vstack([H, avg * np.abs(rng.standard_normal((extra, H.shape[1])))])
+	return W, H
+
+
+def _fit(method, ks, n_top_words, warm_start):
+	X = _SHARED['X']
+	results = []
+	prev = None
+
+	for ntopics in ks:
+		start = time.perf_counter()
+		with PeakMemory() as mem:
+			if method == 'lda':
+				model = lda_model(ntopics, n_jobs=1)
+				model.fit(X)
+				components = model.components_
+			elif method == 'lsa':
+				model = lsa_model(ntopics)
+				model.fit(X)
+				components = model.steps[0][1].components_
+			elif warm_start and prev is not None and prev[1].shape[0] < ntopics:
+				model = nmf_model(ntopics, init='custom')
+				W, H = _grow(prev[0], prev[1], ntopics, np.sqrt(X.mean() / ntopics), ntopics)
+				prev = (model.fit_transform(X, W=W, H=H), model.components_)
+				components = model.components_
+			else:
+				model = nmf_model(ntopics)
+				prev = (model.fit_transform(X), model.components_)
+				components = model.components_
+
+		results.append({'method': method, 'ntopics': ntopics, 'seconds': time.perf_counter() - start,
+				'peak_mb': mem.peak_mb, 'top_terms': top_k(components.T, n_top_words).T})
+	return results
+
+
+def topic_sweep(vec_data, vectorizor, ntopics=range(5, 55, 5), methods=METHODS, w2v_model=None,
+		n_top_words=10, warm_start=True, processes=None):
+	'''
+	takes:
+		vec_data --> vectorized data ex: tfidf, bow (shared read only with the workers)
+		vectorizor --> the fitted vectorizer, terms are looked up once
+		ntopics --> topic counts to try ex: range(5, 55, 5)
+		methods --> any of 'lda', 'nmf', 'lsa'
+		w2v_model --> word2vec model for calculate_coherence, None to skip
+		n_top_words --> terms per topic used for coherence
+		warm_start --> fit NMF over increasing topic counts in one worker, each
+		               starting from the previous factors plus new random topics
+		processes --> worker processes, None for all cpus
+	returns:
+		one row per (method, ntopics) with fit seconds, peak extra memory (MB),
+		coherence and the top terms of each topic
+	'''
+	ks = sorted(ntopics)
+	tasks = []
+	for method in methods:
+		if method == 'nmf' and warm_start:
+			tasks.append((method, ks))
+		else:
+			tasks.extend((method, [k]) for k in ks)
+
+	shm, spec = _share(vec_data)
+	try:
+		with ProcessPoolExecutor(max_workers=processes, initializer=_attach,
+					 initargs=(shm.name, spec)) as pool:
+			futures = [pool.submit(_fit, method, k, n_top_words, warm_start) for method, k in tasks]
+			results = [r for future in as_completed(futures) for r in future.result()]
+	finally:
+		shm.close()
+		shm.unlink()
+
+	terms = np.asarray(feature_names(vectorizor), dtype=object)
+	for r in results:
+		r['top_terms'] = [list(terms[idx]) for idx in r['top_terms']]
+		r['coherence'] = np.nan if w2v_model is None else calculate_coherence(w2v_model, r['top_terms'])
+
+	df = pd.DataFrame(results, columns=['method', 'ntopics', 'seconds', 'peak_mb', 'coherence', 'top_terms'])
+	return df.sort_values(['method', 'ntopics']).reset_index(drop=True)